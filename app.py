@@ -3,12 +3,23 @@ import pandas as pd
 import os
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
-import json
+from langchain_core.rate_limiters import InMemoryRateLimiter
+from langchain_core.exceptions import ModelAPIError, ModelConnectionError, ModelRateLimitError, ModelTimeoutError
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+import orjson
+import re
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-import time
+import xlsxwriter
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import OrderedDict
+import hashlib
+import diskcache
+import pyarrow as pa
+from pyarrow import csv as pacsv
 from io import BytesIO
+from orjson_disk import OrjsonDisk
 
 # --- CONFIGURATION ---
 st.set_page_config(
@@ -17,6 +28,88 @@ st.set_page_config(
     layout="wide"
 )
 
+# Max Gemini requests in flight at once
+LLM_CONCURRENCY = 8
+
+# Gemini request quota, enforced by a token bucket shared by all calls
+LLM_REQUESTS_PER_MINUTE = 60
+
+# Batch calls are retried with jittered exponential backoff on these errors;
+# ValueError covers replies with no parseable JSON. langchain's timeout and
+# connection errors don't subclass the builtin ones, so they are listed too.
+# The client itself doesn't retry (max_retries=0), so these are the only attempts
+LLM_ATTEMPTS = 4
+LLM_RETRY_ERRORS = (
+    TimeoutError, ValueError, ModelTimeoutError, ModelConnectionError,
+    ModelRateLimitError, ModelAPIError
+)
+LLM_BACKOFF = wait_random_exponential(multiplier=1, max=30)
+
+# Longest server-requested wait (Retry-After / Gemini retryDelay) honored on a 429
+LLM_MAX_RETRY_AFTER = 60
+JSON_ONLY_REMINDER = "\n\nReply with ONLY the JSON array. No markdown, no explanation."
+
+# Batches are packed up to a prompt token budget, estimated from character count
+LLM_BATCH_TOKEN_BUDGET = 1500
+LLM_MAX_BATCH_SIZE = 30
+CHARS_PER_TOKEN = 4
+
+# CSV columns read from each upload
+KODO_COLUMNS = [
+    'Date (IST)', 'Dr/Cr', 'Txn Amount (INR)', 'Category',
+    'Narration on Kodo Pay', 'Maker Comments', 'Maker Name'
+]
+TRANSACTION_COLUMNS = [
+    'Txn Date', 'Txn Category', 'Txn Amount (Rs.)', 'Expense Category',
+    'Merchant/Narration', 'Notes', 'Cardholder First Name', 'Cardholder Last Name'
+]
+
+# Case-insensitive filters, compiled once
+LQ_PREPAID_RE = re.compile(r'lq prepaid', re.IGNORECASE)
+MECHANICAL_HW_RE = re.compile(r'mechanical hardware', re.IGNORECASE)
+VISHWANATH_RE = re.compile(r'vishwanath', re.IGNORECASE)
+JSON_RE = re.compile(r'\[.*\]|\{.*\}', re.DOTALL)
+RETRY_DELAY_RE = re.compile(r"retryDelay'?\"?:\s*'?\"?(\d+(?:\.\d+)?)s")
+NON_ALPHA_RE = re.compile(r'[^a-z]+')
+
+# On-disk cache of LLM categorizations, shared across runs
+LLM_CACHE = diskcache.Cache(".llm_cache", disk=OrjsonDisk)
+
+# Most LLM_CACHE entries kept in memory, least recently used dropped first
+LLM_MEMO_SIZE = 50_000
+
+# On-disk cache of finished reports (categorized rows + xlsx bytes), keyed on the uploads
+REPORT_CACHE = diskcache.Cache(".report_cache", size_limit=2 << 30)
+
+# Longest description/reasoning shown in the Excel statement sheets
+STATEMENT_TEXT_LENGTH = 80
+
+# Column widths shared by the CAPEX and OPEX statement sheets: (first_col, last_col, width)
+STATEMENT_COLUMN_WIDTHS = (
+    (0, 0, 12),  # Date
+    (1, 1, 15),  # Source
+    (2, 2, 20),  # Category
+    (3, 3, 15),  # Amount
+    (4, 4, 40),  # Description
+    (5, 5, 15),  # Method
+    (6, 6, 40),  # Reasoning
+)
+
+# Named cell formats for the Excel report, registered once per workbook
+REPORT_FORMATS = {
+    'header': {'bg_color': '#1F4E78', 'font_color': '#FFFFFF', 'bold': True, 'font_size': 11, 'border': 1},
+    'title': {'font_size': 16, 'bold': True, 'font_color': '#1F4E78'},
+    'subtitle': {'font_size': 12, 'bold': True},
+    'note': {'font_size': 10, 'italic': True},
+    'total': {'bold': True, 'font_size': 11},
+    'cell': {'border': 1},
+    'currency': {'num_format': '₹#,##0.00', 'border': 1},
+    'percent': {'num_format': '0.0%', 'border': 1},
+    'subtotal': {'num_format': '₹#,##0.00', 'bold': True, 'font_size': 11, 'bg_color': '#E7E6E6'},
+    'grand_label': {'bold': True, 'font_size': 12},
+    'grand': {'num_format': '₹#,##0.00', 'bold': True, 'font_size': 12, 'bg_color': '#D9D9D9'}
+}
+
 # Load API Key from secrets (Environment Variable)
 try:
     API_KEY = st.secrets["GOOGLE_API_KEY"]
@@ -46,15 +139,58 @@ st.markdown("""
 
 # --- HELPER FUNCTIONS ---
 
+@st.cache_resource
+def get_event_loop():
+    """
+    One long-lived event loop, on a daemon thread, for all async LLM calls.
+    
+    The cached LLM client keeps its HTTP connections on the loop that opened
+    them, so every run has to use the same loop rather than asyncio.run().
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+@st.cache_resource
+def get_report_executor():
+    """Worker thread that builds Excel reports while the page renders."""
+    return ThreadPoolExecutor(max_workers=1)
+
+@st.cache_resource
+def get_llm_memo():
+    """In-process LRU copy of LLM_CACHE entries, kept across Streamlit reruns."""
+    return OrderedDict()
+
+@st.cache_resource
+def get_llm_memo_lock():
+    """Lock around get_llm_memo(), which every session's script thread shares."""
+    return threading.Lock()
+
+@st.cache_resource
 def get_llm():
     return ChatGoogleGenerativeAI(
         model="gemini-2.5-flash",
         google_api_key=API_KEY,
         temperature=0,
-        max_retries=2,
-        request_timeout=60
+        max_retries=0,
+        request_timeout=60,
+        rate_limiter=InMemoryRateLimiter(
+            requests_per_second=LLM_REQUESTS_PER_MINUTE / 60,
+            max_bucket_size=LLM_CONCURRENCY
+        )
     )
 
+def parse_llm_json(content):
+    """
+    Parse the JSON array (or object) in an LLM reply, ignoring code fences and
+    any prose around it. A lone object is returned as a one-item list.
+    """
+    match = JSON_RE.search(content)
+    if not match:
+        raise ValueError(f"No JSON in response: {content[:100]}")
+    parsed = orjson.loads(match.group(0))
+    return [parsed] if isinstance(parsed, dict) else parsed
+
 def generate_categories(transactions, status_text):
     status_text.text("Senior Analyst: Generating expense categories...")
     llm = get_llm()
@@ -80,104 +216,405 @@ def generate_categories(transactions, status_text):
     )
     
     try:
-        response = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=desc_text)])
-        content = response.content.strip().replace('```json', '').replace('```', '').strip()
-        categories = json.loads(content)
+        response = llm.with_retry(
+            retry_if_exception_type=LLM_RETRY_ERRORS,
+            stop_after_attempt=LLM_ATTEMPTS
+        ).invoke([SystemMessage(content=system_prompt), HumanMessage(content=desc_text)])
+        categories = parse_llm_json(response.content)
         return categories
     except Exception as e:
         print(f"Category Gen Error: {e}")
         return ["Lab Supplies", "Office Supplies", "Travel", "Meals", "Software", "Hardware", "Consulting", "Shipping", "Rent", "Utilities", "Other"]
 
 
-def process_files(kodo_file, trans_file, progress_bar, status_text):
-    transactions = []
+def prompt_lines(df):
+    """Each transaction as it appears in a categorization prompt, built once per frame."""
+    return (
+        '₹' + df['amount'].map('{:,.2f}'.format) + ' | Cat: ' + df['category']
+        + ' | Desc: ' + df['description'].str[:100]
+    )
+
+def batch_prompt(heading, batch):
+    """A numbered LLM prompt from the precomputed prompt lines of `batch`."""
+    return heading + "".join(f"{idx}. {txn['prompt_line']}\n" for idx, txn in enumerate(batch, 1))
+
+def pack_batches(txns):
+    """
+    Greedily pack transactions into LLM batches of up to LLM_BATCH_TOKEN_BUDGET
+    estimated prompt tokens (and at most LLM_MAX_BATCH_SIZE transactions).
+    
+    Transactions are sorted by description length first so that short lines
+    share a batch instead of being capped by a fixed count.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for txn in sorted(txns, key=lambda t: len(t['description'])):
+        tokens = len(txn['prompt_line']) // CHARS_PER_TOKEN + 1
+        if batch and (batch_tokens + tokens > LLM_BATCH_TOKEN_BUDGET or len(batch) >= LLM_MAX_BATCH_SIZE):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(txn)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def retry_after(error):
+    """
+    Seconds a rate-limited reply asked us to wait, from Gemini's retryDelay or
+    an HTTP Retry-After header, or None if it didn't say.
+    """
+    match = RETRY_DELAY_RE.search(str(error))
+    if match:
+        return float(match.group(1))
+    response = getattr(error.__cause__, 'response', None)
+    header = getattr(response, 'headers', {}).get('retry-after')
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return None
+
+def llm_retry_wait(retry_state):
+    """Wait as long as a 429 asks, up to LLM_MAX_RETRY_AFTER; otherwise back off with jitter."""
+    error = retry_state.outcome.exception()
+    if isinstance(error, ModelRateLimitError):
+        delay = retry_after(error)
+        if delay is not None:
+            return min(delay, LLM_MAX_RETRY_AFTER)
+    return LLM_BACKOFF(retry_state)
+
+def run_llm_batches(llm, system_prompt, batch_prompts, on_batch_done):
+    """
+    Send every batch prompt to the LLM concurrently, with at most
+    LLM_CONCURRENCY requests in flight.
+    
+    Transient failures are retried up to LLM_ATTEMPTS times; a reply without
+    valid JSON is retried with a stricter JSON-only system prompt.
+    
+    Returns the parsed JSON for each batch in prompt order, or the exception
+    raised for that batch. `on_batch_done(count)` is called as each one finishes.
+    """
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    
+    async def run_batch(batch_prompt):
+        prompt = system_prompt
+        async with semaphore:
+            try:
+                async for attempt in AsyncRetrying(
+                    wait=llm_retry_wait,
+                    stop=stop_after_attempt(LLM_ATTEMPTS),
+                    retry=retry_if_exception_type(LLM_RETRY_ERRORS),
+                    reraise=True
+                ):
+                    with attempt:
+                        response = await llm.ainvoke([SystemMessage(content=prompt), HumanMessage(content=batch_prompt)])
+                        try:
+                            return parse_llm_json(response.content)
+                        except ValueError:
+                            prompt = system_prompt + JSON_ONLY_REMINDER
+                            raise
+            except Exception as e:
+                return e
+    
+    # Requests run on the shared loop; results are collected here so that
+    # progress updates happen on the Streamlit script thread
+    loop = get_event_loop()
+    futures = {
+        asyncio.run_coroutine_threadsafe(run_batch(batch_prompt), loop): idx
+        for idx, batch_prompt in enumerate(batch_prompts)
+    }
+    results = [None] * len(batch_prompts)
+    for done, future in enumerate(as_completed(futures), 1):
+        results[futures[future]] = future.result()
+        on_batch_done(done)
+    return results
+
+def match_results(batch, results):
+    """
+    Pair each LLM result with its transaction by the `id` (prompt line number)
+    it echoes back. Results without a usable id are dropped rather than guessed
+    from reply order, and a repeated id keeps its first result. Transactions
+    without a result are left out.
+    """
+    by_id = {}
+    for result in results:
+        if not isinstance(result, dict):
+            continue
+        try:
+            result_id = int(result.pop('id'))
+        except (KeyError, TypeError, ValueError):
+            continue
+        by_id.setdefault(result_id, result)
+    return [(txn, by_id[idx]) for idx, txn in enumerate(batch, 1) if idx in by_id]
+
+def set_llm_results(tdf, rows, results, method):
+    """Write LLM answers ({type, category, reasoning} dicts) onto `rows` of the transactions frame."""
+    if not rows:
+        return
+    tdf.loc[rows, 'expense_type'] = [result.get('type', 'OPEX') for result in results]
+    tdf.loc[rows, 'category'] = [result.get('category', cat) for result, cat in zip(results, tdf.loc[rows, 'category'])]
+    tdf.loc[rows, 'reasoning'] = [result.get('reasoning', '') for result in results]
+    tdf.loc[rows, ['confidence', 'method']] = ['llm', method]
+
+def llm_cache_key(txn):
+    """Key an LLM categorization on the transaction's category and description."""
+    text = f"{txn['category']}|{txn['description'][:200]}"
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def memo_get(key):
+    """An LLM answer from the in-memory LRU, marked as just used; None if absent."""
+    memo = get_llm_memo()
+    with get_llm_memo_lock():
+        if key not in memo:
+            return None
+        memo.move_to_end(key)
+        return memo[key]
+
+def memo_set(key, result):
+    """Put an LLM answer in the in-memory LRU, dropping the oldest past LLM_MEMO_SIZE."""
+    memo = get_llm_memo()
+    with get_llm_memo_lock():
+        memo[key] = result
+        memo.move_to_end(key)
+        if len(memo) > LLM_MEMO_SIZE:
+            memo.popitem(last=False)
+
+def cache_get(key):
+    """Look up a cached LLM answer in memory first, then on disk."""
+    cached = memo_get(key)
+    if cached is None:
+        cached = LLM_CACHE.get(key)
+        if not cached:
+            return None
+        memo_set(key, cached)
+    return cached
+
+def cache_set(key, result):
+    """Store an LLM answer in memory and on disk."""
+    memo_set(key, result)
+    LLM_CACHE[key] = result
+
+def semantic_cache_key(txn):
+    """
+    Key an LLM categorization on a normalized form of the category and
+    description plus the amount rounded to the nearest hundred, so
+    near-duplicates that differ only in case, digits or punctuation (order
+    numbers, dates) share one cached answer, but a much larger or smaller
+    spend with the same wording is categorized on its own.
+    """
+    text = NON_ALPHA_RE.sub(' ', f"{txn['category']}|{txn['description'][:100]}".lower()).strip()
+    text += f"|{round(txn['amount'], -2):.0f}"
+    return 'norm:' + hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def report_cache_key(kodo_file, trans_file):
+    """REPORT_CACHE key for a pair of uploads: a digest of each file's bytes."""
+    return ':'.join(
+        hashlib.blake2b(upload.getvalue(), digest_size=16).hexdigest() if upload else '-'
+        for upload in (kodo_file, trans_file)
+    )
+
+def load_report(report_key):
+    """The cached report for these uploads ({'data', 'errors', 'xlsx', 'generated'}), or None."""
+    return REPORT_CACHE.get(report_key)
+
+def save_report(report_key, categorized_data, errors, xlsx, generated):
+    """
+    Cache a finished report for the next run on the same uploads. Runs with
+    unresolved fallbacks aren't kept, so a retry can still reach the LLM.
+    """
+    if any(t.get('method') == 'fallback' for t in categorized_data):
+        return
+    REPORT_CACHE.set(report_key, {
+        'data': categorized_data,
+        'errors': errors,
+        'xlsx': xlsx,
+        'generated': generated
+    })
+
+def read_csv(data, columns, amount_columns=()):
+    """
+    Parse CSV bytes with pyarrow's multi-threaded reader, loading only `columns`.
+    
+    Amount columns are read as floats and everything else as text (so dates are
+    kept exactly as written). Blank cells come back as nulls, like
+    pandas.read_csv, and columns missing from the file are left out. The Arrow
+    table is released column by column as it is converted, so peak memory stays
+    near one copy of the data.
+    """
+    present = set(pacsv.open_csv(BytesIO(data)).schema.names)
+    columns = [c for c in columns if c in present]
+    if not columns:
+        return pd.DataFrame()
+    convert_options = pacsv.ConvertOptions(
+        include_columns=columns,
+        strings_can_be_null=True,
+        column_types={c: pa.float64() if c in amount_columns else pa.string() for c in columns}
+    )
+    table = pacsv.read_csv(BytesIO(data), convert_options=convert_options)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+def text_column(df, column, default=''):
+    """Return a column as clean strings (blank cells as ''), or `default` for every row if the column is missing."""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[column].fillna('').astype(str)
+
+def amount_column(df, column):
+    """Return a numeric column as floats, treating missing values as 0."""
+    if column not in df.columns:
+        return pd.Series(0.0, index=df.index)
+    return df[column].fillna(0).astype('float64')
+
+@st.cache_data
+def load_transactions(kodo_data, trans_data):
+    """
+    Load the uploaded CSV bytes into one normalized frame and apply the
+    business rules. Cached on the file contents, so a rerun with the same
+    uploads goes straight to the LLM stage.
+    
+    Returns (frame, errors); the frame is None when nothing could be loaded.
+    """
+    sources = []
     errors = []
     
     # 1. LOAD KODO PAY
-    if kodo_file:
+    if kodo_data:
         try:
-            status_text.text("Loading Kodo Pay data...")
-            kodo_df = pd.read_csv(kodo_file)
-            kodo_debit = kodo_df[kodo_df['Dr/Cr'] == 'Dr'].copy()
+            kodo_df = read_csv(kodo_data, KODO_COLUMNS, amount_columns=['Txn Amount (INR)'])
+            narration = text_column(kodo_df, 'Narration on Kodo Pay')
+            comments = text_column(kodo_df, 'Maker Comments')
             
-            for _, row in kodo_debit.iterrows():
-                narration = str(row.get('Narration on Kodo Pay', ''))
-                comments = str(row.get('Maker Comments', ''))
-                
-                # FILTER: Skip LQ Prepaid
-                if 'lq prepaid' in narration.lower() or 'lq prepaid' in comments.lower():
-                    continue
-                    
-                transactions.append({
-                    'source': 'Kodo-Pay',
-                    'date': str(row.get('Date (IST)', '')),
-                    'amount': float(row.get('Txn Amount (INR)', 0)),
-                    'category': str(row.get('Category', 'Uncategorized')),
-                    'narration': narration,
-                    'comments': comments,
-                    'maker_name': str(row.get('Maker Name', '')),
-                    'description': f"{narration} | {row.get('Category', '')} | {comments} | {row.get('Maker Name', '')}"
-                })
+            # FILTER: Debits only, skipping LQ Prepaid, in one mask and one slice
+            lq_prepaid = narration.str.contains(LQ_PREPAID_RE) | comments.str.contains(LQ_PREPAID_RE)
+            keep = (kodo_df['Dr/Cr'] == 'Dr') & ~lq_prepaid
+            kodo_debit = kodo_df[keep]
+            narration, comments = narration[keep], comments[keep]
+            category = text_column(kodo_debit, 'Category')
+            maker_name = text_column(kodo_debit, 'Maker Name')
+            
+            kodo_txns = pd.DataFrame({
+                'source': 'Kodo-Pay',
+                'date': text_column(kodo_debit, 'Date (IST)'),
+                'amount': amount_column(kodo_debit, 'Txn Amount (INR)'),
+                'category': text_column(kodo_debit, 'Category', 'Uncategorized'),
+                'narration': narration,
+                'comments': comments,
+                'maker_name': maker_name,
+                'description': narration + ' | ' + category + ' | ' + comments + ' | ' + maker_name
+            })
+            sources.append(kodo_txns)
         except Exception as e:
             errors.append(f"Kodo Pay Error: {str(e)}")
 
     # 2. LOAD TRANSACTIONS
-    if trans_file:
+    if trans_data:
         try:
-            status_text.text("Loading Transactions data...")
-            trans_df = pd.read_csv(trans_file)
-            # Filter out FUNDING/CREDIT
-            if 'Txn Category' in trans_df.columns:
-                trans_debit = trans_df[~trans_df['Txn Category'].isin(['FUNDING', 'CARD_CREDIT'])].copy()
-            else:
-                trans_debit = trans_df.copy()
-                
-            for _, row in trans_debit.iterrows():
-                merchant = str(row.get('Merchant/Narration', ''))
-                
-                # FILTER: Skip LQ Prepaid
-                if 'lq prepaid' in merchant.lower():
-                    continue
-                    
-                transactions.append({
-                    'source': 'Transactions',
-                    'date': str(row.get('Txn Date', '')),
-                    'amount': float(row.get('Txn Amount (Rs.)', 0)),
-                    'category': str(row.get('Expense Category', 'Uncategorized')),
-                    'merchant': merchant,
-                    'narration': merchant,
-                    'comments': str(row.get('Notes', '')),
-                    'cardholder': f"{row.get('Cardholder First Name', '')} {row.get('Cardholder Last Name', '')}",
-                    'description': f"{merchant} | {row.get('Expense Category', '')} | {row.get('Notes', '')} | {row.get('Cardholder First Name', '')}"
-                })
+            trans_df = read_csv(trans_data, TRANSACTION_COLUMNS, amount_columns=['Txn Amount (Rs.)'])
+            merchant = text_column(trans_df, 'Merchant/Narration')
+            
+            # FILTER: Drop FUNDING/CREDIT and LQ Prepaid in one mask and one slice
+            lq_prepaid = merchant.str.contains(LQ_PREPAID_RE)
+            keep = ~text_column(trans_df, 'Txn Category').isin(['FUNDING', 'CARD_CREDIT']) & ~lq_prepaid
+            trans_debit = trans_df[keep]
+            merchant = merchant[keep]
+            category = text_column(trans_debit, 'Expense Category')
+            notes = text_column(trans_debit, 'Notes')
+            first_name = text_column(trans_debit, 'Cardholder First Name')
+            
+            trans_txns = pd.DataFrame({
+                'source': 'Transactions',
+                'date': text_column(trans_debit, 'Txn Date'),
+                'amount': amount_column(trans_debit, 'Txn Amount (Rs.)'),
+                'category': text_column(trans_debit, 'Expense Category', 'Uncategorized'),
+                'merchant': merchant,
+                'narration': merchant,
+                'comments': notes,
+                'cardholder': first_name + ' ' + text_column(trans_debit, 'Cardholder Last Name'),
+                'description': merchant + ' | ' + category + ' | ' + notes + ' | ' + first_name
+            })
+            sources.append(trans_txns)
         except Exception as e:
             errors.append(f"Transactions Error: {str(e)}")
 
-    if not transactions:
+    # One normalized frame for both sources
+    tdf = pd.concat(sources, ignore_index=True) if sources else pd.DataFrame()
+    if tdf.empty:
         return None, errors
+    
+    # Blank out columns only one sheet has, leaving amount as a float64 column
+    # so the rule threshold and later totals run on the NumPy array
+    text_cols = tdf.columns.drop('amount')
+    tdf[text_cols] = tdf[text_cols].fillna('')
 
     # 3. CATEGORIZATION
-    categorized = []
-    llm_needed = []
-    
-    status_text.text("Applying Business Rules...")
+    # Output columns, filled in place by the rules, the cache and the LLM
+    tdf['original_category'] = tdf['category']
+    tdf['expense_type'] = 'OPEX'
+    tdf['confidence'] = 'low'
+    tdf['reasoning'] = ''
+    tdf['method'] = 'pending'
     
     # Business Rules
-    for txn in transactions:
-        all_text = f"{txn['category']} {txn['description']} {txn.get('narration','')} {txn.get('comments','')}".lower()
-        maker_name = txn.get('maker_name', '').lower()
-        
-        # Rule 1: Mechanical Hardware
-        if 'mechanical hardware' in txn['category'].lower() or 'mechanical hardware' in all_text:
-            categorized.append({**txn, 'expense_type': 'CAPEX', 'confidence': 'high', 'reasoning': 'Business Rule: Mechanical Hardware', 'method': 'business-rule', 'original_category': txn['category']})
-            continue
-            
-        # Rule 2: Vishwanatha > 1000
-        if ('vishwanatha' in maker_name or 'vishwanath' in maker_name) and txn['category'] == 'Uncategorized' and txn['amount'] > 1000:
-            categorized.append({**txn, 'expense_type': 'CAPEX', 'confidence': 'high', 'reasoning': 'Business Rule: Vishwanatha > 1000', 'method': 'business-rule', 'category': 'Capital Investment', 'original_category': txn['category']})
+    # Rule 1: Mechanical Hardware, anywhere in the description (which already
+    # holds the category, narration and comments)
+    mechanical_hw = tdf['description'].str.contains(MECHANICAL_HW_RE)
+    tdf.loc[mechanical_hw, ['expense_type', 'confidence', 'reasoning', 'method']] = [
+        'CAPEX', 'high', 'Business Rule: Mechanical Hardware', 'business-rule'
+    ]
+    
+    # Rule 2: Vishwanatha > 1000
+    vishwanatha = (
+        text_column(tdf, 'maker_name').str.contains(VISHWANATH_RE)
+        & (tdf['category'] == 'Uncategorized')
+        & (tdf['amount'] > 1000)
+        & ~mechanical_hw
+    )
+    tdf.loc[vishwanatha, ['expense_type', 'confidence', 'reasoning', 'method', 'category']] = [
+        'CAPEX', 'high', 'Business Rule: Vishwanatha > 1000', 'business-rule', 'Capital Investment'
+    ]
+    
+    # Prompt lines for everything the rules left to the LLM, reused by QC
+    pending = tdf.index[tdf['method'] == 'pending']
+    tdf['prompt_line'] = ''
+    if len(pending):
+        tdf.loc[pending, 'prompt_line'] = prompt_lines(tdf.loc[pending])
+    
+    return tdf, errors
+
+def process_files(kodo_file, trans_file, progress_bar, status_text):
+    status_text.text("Loading data and applying business rules...")
+    tdf, errors = load_transactions(
+        kodo_file.getvalue() if kodo_file else None,
+        trans_file.getvalue() if trans_file else None
+    )
+    if tdf is None:
+        return None, errors
+    
+    # Reuse the LLM's answer for transactions it has already seen,
+    # first exactly, then by normalized text; Uncategorized rows only match
+    # exactly, since their category carries no signal of its own
+    # Repeats of an uncached transaction within the upload are sent once and
+    # share its answer, tracked through the representative's `rows`
+    pending = tdf.index[tdf['method'] == 'pending']
+    uncached = {}
+    cache_hits = {'exact-cache': ([], []), 'semantic-cache': ([], [])}
+    for row, txn in zip(pending, tdf.loc[pending, ['category', 'description', 'amount', 'prompt_line']].to_dict('records')):
+        key = llm_cache_key(txn)
+        if key in uncached:
+            uncached[key]['rows'].append(row)
             continue
-            
-        llm_needed.append(txn)
+        method, cached = 'exact-cache', cache_get(key)
+        if not cached and txn['category'] != 'Uncategorized':
+            method, cached = 'semantic-cache', cache_get(semantic_cache_key(txn))
+        if cached:
+            cache_hits[method][0].append(row)
+            cache_hits[method][1].append(cached)
+        else:
+            txn['key'], txn['rows'] = key, [row]
+            uncached[key] = txn
+    for method, (cached_rows, cached_results) in cache_hits.items():
+        set_llm_results(tdf, cached_rows, cached_results, method)
+    llm_needed = list(uncached.values())
 
     # LLM Analysis
     if llm_needed:
@@ -187,8 +624,8 @@ def process_files(kodo_file, trans_file, progress_bar, status_text):
         status_text.text(f"Senior Analyst defined {len(categories_list)} categories.")
         
         llm = get_llm()
-        batch_size = 5
-        total_batches = (len(llm_needed) + batch_size - 1) // batch_size
+        batches = pack_batches(llm_needed)
+        total_batches = len(batches)
         
         system_prompt = (
             "You are a financial analyst for a HARDWARE COMPANY.\n"
@@ -200,305 +637,191 @@ def process_files(kodo_file, trans_file, progress_bar, status_text):
             "OPEX: Regular/recurring (Rent, utilities, supplies, food, travel, salaries)\n\n"
             "CATEGORY — Assign the single best-fit category from this list:\n"
             f"{category_str}\n\n"
-            "Respond with JSON: {\"type\": \"CAPEX\" or \"OPEX\", \"category\": \"assigned category\", \"reasoning\": \"brief explanation\"}"
+            "Respond with a JSON array, one object per transaction: {\"id\": transaction number, \"type\": \"CAPEX\" or \"OPEX\", \"category\": \"assigned category\", \"reasoning\": \"brief explanation\"}"
         )
         
-        for i in range(0, len(llm_needed), batch_size):
-            batch = llm_needed[i:i+batch_size]
-            current_batch = i // batch_size + 1
-            
-            status_text.text(f"Junior Analyst classifying batch {current_batch}/{total_batches}...")
-            progress_bar.progress(current_batch / total_batches)
-            
-            batch_prompt = "Categorize:\n\n"
-            for idx, txn in enumerate(batch):
-                batch_prompt += f"{idx+1}. ₹{txn['amount']:,.2f} | Cat: {txn['category']} | Desc: {txn['description'][:100]}\n"
-            
+        batch_prompts = [batch_prompt("Categorize:\n\n", batch) for batch in batches]
+        
+        def on_batch_done(done):
+            status_text.text(f"Junior Analyst classified batch {done}/{total_batches}...")
+            progress_bar.progress(done / total_batches)
+        
+        status_text.text(f"Junior Analyst classifying {total_batches} batches...")
+        batch_results = run_llm_batches(llm, system_prompt, batch_prompts, on_batch_done)
+        
+        for batch, results in zip(batches, batch_results):
+            rows = [row for txn in batch for row in txn['rows']]
             try:
-                response = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=batch_prompt)])
-                content = response.content.strip().replace('```json', '').replace('```', '').strip()
-                results = json.loads(content)
+                if isinstance(results, Exception):
+                    raise results
                 
-                for txn, result in zip(batch, results):
-                    assigned_cat = result.get('category', txn['category'])
-                    
-                    categorized.append({
-                        **txn,
-                        'expense_type': result.get('type', 'OPEX'),
-                        'category': assigned_cat,
-                        'original_category': txn['category'],
-                        'confidence': 'llm',
-                        'reasoning': result.get('reasoning', ''),
-                        'method': 'junior-analyst'
-                    })
+                matched = match_results(batch, results)
+                set_llm_results(
+                    tdf,
+                    [row for txn, _ in matched for row in txn['rows']],
+                    [result for txn, result in matched for _ in txn['rows']],
+                    'junior-analyst'
+                )
+                for txn, result in matched:
+                    cache_set(txn['key'], result)
+                    if txn['category'] != 'Uncategorized':
+                        cache_set(semantic_cache_key(txn), result)
             except Exception as e:
-                for txn in batch:
-                    categorized.append({**txn, 'expense_type': 'OPEX', 'confidence': 'low', 'reasoning': f'Error: {str(e)}', 'method': 'fallback', 'original_category': txn['category']})
-            
-            time.sleep(1) # Rate limit safety
-
-    return categorized, errors
-
-def create_excel(categorized_data):
-    wb = Workbook()
-    
-    # Styles
-    header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True, size=11)
-    title_font = Font(size=16, bold=True, color="1F4E78")
-    subtitle_font = Font(size=12, bold=True)
-    total_font = Font(bold=True, size=11)
-    currency_fmt = '₹#,##0.00'
-    percent_fmt = '0.0%'
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+                tdf.loc[rows, ['reasoning', 'method']] = [f'Error: {str(e)}', 'fallback']
+        
+        # Transactions the reply left out
+        tdf.loc[tdf['method'] == 'pending', ['reasoning', 'method']] = ['Error: No LLM result', 'fallback']
+
+    return tdf.to_dict('records'), errors
+
+def add_formats(wb, specs):
+    """Register each named format spec on the workbook once; returns {name: Format}."""
+    return {name: wb.add_format(spec) for name, spec in specs.items()}
+
+def write_statement_rows(ws, df, grand_total, fmt):
+    """
+    Write a statement sheet's transactions grouped by category, each group
+    followed by its subtotal, then the grand total. Description and reasoning
+    are written as given, already cut to STATEMENT_TEXT_LENGTH by main().
+    """
+    grouped = df.groupby('category', sort=True)
+    subtotals = grouped['amount'].sum()
+    current_row = 4
     
-    capex = [t for t in categorized_data if t['expense_type'] == 'CAPEX']
-    opex = [t for t in categorized_data if t['expense_type'] == 'OPEX']
-    total_amt = sum(t['amount'] for t in categorized_data)
-    capex_amt = sum(t['amount'] for t in capex)
-    opex_amt = sum(t['amount'] for t in opex)
+    for category, cat_txns in grouped:
+        rows = cat_txns[['date', 'source', 'category', 'amount', 'description', 'method', 'reasoning']]
+        for date, source, cat, amount, description, method, reasoning in rows.itertuples(index=False, name=None):
+            ws.write_row(current_row, 0, (date, source, cat), fmt['cell'])
+            ws.write(current_row, 3, amount, fmt['currency'])
+            ws.write_row(current_row, 4, (description, method, reasoning), fmt['cell'])
+            current_row += 1
+        
+        # Subtotal
+        ws.write(current_row, 2, f"{category} Subtotal", fmt['total'])
+        ws.write(current_row, 3, subtotals[category], fmt['subtotal'])
+        current_row += 1
+    
+    # Grand Total
+    current_row += 1
+    ws.write(current_row, 2, "GRAND TOTAL", fmt['grand_label'])
+    ws.write(current_row, 3, grand_total, fmt['grand'])
+
+def category_totals(cdf):
+    """
+    Amount and transaction count per category for each expense type, from one
+    groupby over all transactions: {expense_type: frame indexed by category,
+    largest amount first}.
+    """
+    by_category = cdf.groupby(['expense_type', 'category'], sort=False)['amount'].agg(['sum', 'count'])
+    by_category = by_category.sort_values('sum', ascending=False)
+    return {expense_type: by_category.xs(expense_type) for expense_type in by_category.index.unique('expense_type')}
+
+def create_excel(capex_df, opex_df, totals, by_category, generated):
+    """
+    Build the 4-sheet spend report from the CAPEX and OPEX transactions, the
+    precomputed `totals` ({'count', 'total', 'capex', 'opex'}) and the
+    per-category breakdown from category_totals(), stamped as generated at
+    the `generated` datetime.
+    """
+    # Stream rows straight into the xlsx archive instead of holding every cell in memory
+    buffer = BytesIO()
+    wb = xlsxwriter.Workbook(buffer, {'constant_memory': True})
+    
+    # Named formats, one xlsxwriter Format each, shared by every sheet
+    fmt = add_formats(wb, REPORT_FORMATS)
+    
+    total_amt = totals['total']
+    capex_amt = totals['capex']
+    opex_amt = totals['opex']
     
     # === SHEET 1: EXECUTIVE SUMMARY ===
-    ws = wb.active
-    ws.title = "Executive Summary"
-    
-    ws['A1'] = "DOGNOSIS FINANCIAL SPEND REPORT"
-    ws['A1'].font = title_font
-    ws.merge_cells('A1:D1')
-    
-    ws['A2'] = f"Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}"
-    ws['A2'].font = Font(size=10, italic=True)
-    
-    ws['A4'] = "FINANCIAL OVERVIEW"
-    ws['A4'].font = subtitle_font
-    
-    summary_data = [
-        ["Metric", "Value"],
-        ["Total Transactions", len(categorized_data)],
-        ["Total Amount", total_amt],
-        ["CAPEX Total", capex_amt],
-        ["OPEX Total", opex_amt],
-        ["CAPEX %", capex_amt/total_amt if total_amt else 0],
-        ["OPEX %", opex_amt/total_amt if total_amt else 0],
-    ]
+    ws = wb.add_worksheet("Executive Summary")
     
-    for r, row in enumerate(summary_data, 5):
-        for c, val in enumerate(row, 1):
-            cell = ws.cell(r, c, val)
-            cell.border = border
-            if r == 5:
-                cell.fill = header_fill
-                cell.font = header_font
-            if c == 2 and r > 6 and r < 10:
-                cell.number_format = currency_fmt
-            if c == 2 and r >= 10:
-                cell.number_format = percent_fmt
-    
-    ws.column_dimensions['A'].width = 25
-    ws.column_dimensions['B'].width = 20
+    ws.merge_range('A1:D1', "DOGNOSIS FINANCIAL SPEND REPORT", fmt['title'])
+    ws.write('A2', f"Generated: {generated.strftime('%B %d, %Y at %I:%M %p')}", fmt['note'])
+    ws.write('A4', "FINANCIAL OVERVIEW", fmt['subtitle'])
     
-    # === SHEET 2: CAPEX STATEMENT ===
-    ws_capex = wb.create_sheet("CAPEX Statement")
+    ws.write_row(4, 0, ["Metric", "Value"], fmt['header'])
+    ws.write_row(5, 0, ["Total Transactions", totals['count']], fmt['cell'])
+    for r, (label, value) in enumerate([("Total Amount", total_amt), ("CAPEX Total", capex_amt), ("OPEX Total", opex_amt)], 6):
+        ws.write(r, 0, label, fmt['cell'])
+        ws.write(r, 1, value, fmt['currency'])
+    for r, (label, value) in enumerate([("CAPEX %", capex_amt/total_amt if total_amt else 0), ("OPEX %", opex_amt/total_amt if total_amt else 0)], 9):
+        ws.write(r, 0, label, fmt['cell'])
+        ws.write(r, 1, value, fmt['percent'])
     
-    ws_capex['A1'] = "CAPITAL EXPENDITURES (CAPEX)"
-    ws_capex['A1'].font = title_font
-    ws_capex.merge_cells('A1:G1')
+    ws.set_column('A:A', 25)
+    ws.set_column('B:B', 20)
     
-    ws_capex['A2'] = f"Total CAPEX: ₹{capex_amt:,.2f}"
-    ws_capex['A2'].font = subtitle_font
+    # === SHEET 2: CAPEX STATEMENT ===
+    ws_capex = wb.add_worksheet("CAPEX Statement")
     
-    headers = ['Date', 'Source', 'Category', 'Amount', 'Description', 'Method', 'Reasoning']
-    for c, h in enumerate(headers, 1):
-        cell = ws_capex.cell(4, c, h)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    ws_capex.merge_range('A1:G1', "CAPITAL EXPENDITURES (CAPEX)", fmt['title'])
+    ws_capex.write('A2', f"Total CAPEX: ₹{capex_amt:,.2f}", fmt['subtitle'])
     
-    # Group by category for subtotals
-    capex_df = pd.DataFrame(capex)
-    current_row = 5
+    headers = ['Date', 'Source', 'Category', 'Amount', 'Description', 'Method', 'Reasoning']
+    ws_capex.write_row(3, 0, headers, fmt['header'])
     
     if not capex_df.empty:
-        for category in sorted(capex_df['category'].unique()):
-            cat_txns = capex_df[capex_df['category'] == category]
-            
-            for _, txn in cat_txns.iterrows():
-                ws_capex.cell(current_row, 1, txn['date']).border = border
-                ws_capex.cell(current_row, 2, txn['source']).border = border
-                ws_capex.cell(current_row, 3, txn['category']).border = border
-                cell_amt = ws_capex.cell(current_row, 4, txn['amount'])
-                cell_amt.number_format = currency_fmt
-                cell_amt.border = border
-                ws_capex.cell(current_row, 5, txn['description'][:80]).border = border
-                ws_capex.cell(current_row, 6, txn['method']).border = border
-                ws_capex.cell(current_row, 7, txn['reasoning'][:80]).border = border
-                current_row += 1
-            
-            # Subtotal
-            subtotal = cat_txns['amount'].sum()
-            ws_capex.cell(current_row, 3, f"{category} Subtotal").font = total_font
-            cell_sub = ws_capex.cell(current_row, 4, subtotal)
-            cell_sub.number_format = currency_fmt
-            cell_sub.font = total_font
-            cell_sub.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
-            current_row += 1
-        
-        # Grand Total
-        current_row += 1
-        ws_capex.cell(current_row, 3, "GRAND TOTAL").font = Font(bold=True, size=12)
-        cell_grand = ws_capex.cell(current_row, 4, capex_amt)
-        cell_grand.number_format = currency_fmt
-        cell_grand.font = Font(bold=True, size=12)
-        cell_grand.fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-    
-    ws_capex.column_dimensions['A'].width = 12
-    ws_capex.column_dimensions['B'].width = 15
-    ws_capex.column_dimensions['C'].width = 20
-    ws_capex.column_dimensions['D'].width = 15
-    ws_capex.column_dimensions['E'].width = 40
-    ws_capex.column_dimensions['F'].width = 15
-    ws_capex.column_dimensions['G'].width = 40
+        write_statement_rows(ws_capex, capex_df, capex_amt, fmt)
     
     # === SHEET 3: OPEX STATEMENT ===
-    ws_opex = wb.create_sheet("OPEX Statement")
-    
-    ws_opex['A1'] = "OPERATING EXPENDITURES (OPEX)"
-    ws_opex['A1'].font = title_font
-    ws_opex.merge_cells('A1:G1')
-    
-    ws_opex['A2'] = f"Total OPEX: ₹{opex_amt:,.2f}"
-    ws_opex['A2'].font = subtitle_font
+    ws_opex = wb.add_worksheet("OPEX Statement")
     
-    for c, h in enumerate(headers, 1):
-        cell = ws_opex.cell(4, c, h)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    ws_opex.merge_range('A1:G1', "OPERATING EXPENDITURES (OPEX)", fmt['title'])
+    ws_opex.write('A2', f"Total OPEX: ₹{opex_amt:,.2f}", fmt['subtitle'])
     
-    # Group by category for subtotals
-    opex_df = pd.DataFrame(opex)
-    current_row = 5
+    ws_opex.write_row(3, 0, headers, fmt['header'])
     
     if not opex_df.empty:
-        for category in sorted(opex_df['category'].unique()):
-            cat_txns = opex_df[opex_df['category'] == category]
-            
-            for _, txn in cat_txns.iterrows():
-                ws_opex.cell(current_row, 1, txn['date']).border = border
-                ws_opex.cell(current_row, 2, txn['source']).border = border
-                ws_opex.cell(current_row, 3, txn['category']).border = border
-                cell_amt = ws_opex.cell(current_row, 4, txn['amount'])
-                cell_amt.number_format = currency_fmt
-                cell_amt.border = border
-                ws_opex.cell(current_row, 5, txn['description'][:80]).border = border
-                ws_opex.cell(current_row, 6, txn['method']).border = border
-                ws_opex.cell(current_row, 7, txn['reasoning'][:80]).border = border
-                current_row += 1
-            
-            # Subtotal
-            subtotal = cat_txns['amount'].sum()
-            ws_opex.cell(current_row, 3, f"{category} Subtotal").font = total_font
-            cell_sub = ws_opex.cell(current_row, 4, subtotal)
-            cell_sub.number_format = currency_fmt
-            cell_sub.font = total_font
-            cell_sub.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
-            current_row += 1
-        
-        # Grand Total
-        current_row += 1
-        ws_opex.cell(current_row, 3, "GRAND TOTAL").font = Font(bold=True, size=12)
-        cell_grand = ws_opex.cell(current_row, 4, opex_amt)
-        cell_grand.number_format = currency_fmt
-        cell_grand.font = Font(bold=True, size=12)
-        cell_grand.fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-    
-    ws_opex.column_dimensions['A'].width = 12
-    ws_opex.column_dimensions['B'].width = 15
-    ws_opex.column_dimensions['C'].width = 20
-    ws_opex.column_dimensions['D'].width = 15
-    ws_opex.column_dimensions['E'].width = 40
-    ws_opex.column_dimensions['F'].width = 15
-    ws_opex.column_dimensions['G'].width = 40
+        write_statement_rows(ws_opex, opex_df, opex_amt, fmt)
+    
+    for ws_statement in (ws_capex, ws_opex):
+        for first_col, last_col, width in STATEMENT_COLUMN_WIDTHS:
+            ws_statement.set_column(first_col, last_col, width)
     
     # === SHEET 4: CATEGORY BREAKDOWN ===
-    ws_cat = wb.create_sheet("Category Breakdown")
+    ws_cat = wb.add_worksheet("Category Breakdown")
     
-    ws_cat['A1'] = "SPEND CATEGORY BREAKDOWN"
-    ws_cat['A1'].font = title_font
-    ws_cat.merge_cells('A1:D1')
+    ws_cat.merge_range('A1:D1', "SPEND CATEGORY BREAKDOWN", fmt['title'])
     
     # CAPEX Categories
-    ws_cat['A3'] = "CAPEX BY CATEGORY"
-    ws_cat['A3'].font = subtitle_font
+    ws_cat.write('A3', "CAPEX BY CATEGORY", fmt['subtitle'])
     
     cat_headers = ['Category', 'Amount', '% of CAPEX', 'Transactions']
-    for c, h in enumerate(cat_headers, 1):
-        cell = ws_cat.cell(4, c, h)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    ws_cat.write_row(3, 0, cat_headers, fmt['header'])
     
-    current_row = 5
-    if not capex_df.empty:
-        capex_by_cat = capex_df.groupby('category').agg({
-            'amount': 'sum',
-            'date': 'count'
-        }).sort_values('amount', ascending=False)
-        
-        for category, row in capex_by_cat.iterrows():
-            ws_cat.cell(current_row, 1, category).border = border
-            cell_amt = ws_cat.cell(current_row, 2, row['amount'])
-            cell_amt.number_format = currency_fmt
-            cell_amt.border = border
-            cell_pct = ws_cat.cell(current_row, 3, row['amount']/capex_amt if capex_amt else 0)
-            cell_pct.number_format = percent_fmt
-            cell_pct.border = border
-            ws_cat.cell(current_row, 4, int(row['date'])).border = border
+    current_row = 4
+    if 'CAPEX' in by_category:
+        for category, amount, count in by_category['CAPEX'].itertuples(name=None):
+            ws_cat.write(current_row, 0, category, fmt['cell'])
+            ws_cat.write(current_row, 1, amount, fmt['currency'])
+            ws_cat.write(current_row, 2, amount/capex_amt if capex_amt else 0, fmt['percent'])
+            ws_cat.write(current_row, 3, count, fmt['cell'])
             current_row += 1
     
     # OPEX Categories
     current_row += 2
-    ws_cat[f'A{current_row}'] = "OPEX BY CATEGORY"
-    ws_cat[f'A{current_row}'].font = subtitle_font
+    ws_cat.write(current_row, 0, "OPEX BY CATEGORY", fmt['subtitle'])
     current_row += 1
     
-    for c, h in enumerate(cat_headers, 1):
-        cell = ws_cat.cell(current_row, c, h)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    ws_cat.write_row(current_row, 0, cat_headers, fmt['header'])
     
     current_row += 1
-    if not opex_df.empty:
-        opex_by_cat = opex_df.groupby('category').agg({
-            'amount': 'sum',
-            'date': 'count'
-        }).sort_values('amount', ascending=False)
-        
-        for category, row in opex_by_cat.iterrows():
-            ws_cat.cell(current_row, 1, category).border = border
-            cell_amt = ws_cat.cell(current_row, 2, row['amount'])
-            cell_amt.number_format = currency_fmt
-            cell_amt.border = border
-            cell_pct = ws_cat.cell(current_row, 3, row['amount']/opex_amt if opex_amt else 0)
-            cell_pct.number_format = percent_fmt
-            cell_pct.border = border
-            ws_cat.cell(current_row, 4, int(row['date'])).border = border
+    if 'OPEX' in by_category:
+        for category, amount, count in by_category['OPEX'].itertuples(name=None):
+            ws_cat.write(current_row, 0, category, fmt['cell'])
+            ws_cat.write(current_row, 1, amount, fmt['currency'])
+            ws_cat.write(current_row, 2, amount/opex_amt if opex_amt else 0, fmt['percent'])
+            ws_cat.write(current_row, 3, count, fmt['cell'])
             current_row += 1
     
-    ws_cat.column_dimensions['A'].width = 30
-    ws_cat.column_dimensions['B'].width = 18
-    ws_cat.column_dimensions['C'].width = 15
-    ws_cat.column_dimensions['D'].width = 15
+    ws_cat.set_column('A:A', 30)
+    ws_cat.set_column('B:B', 18)
+    ws_cat.set_column('C:D', 15)
     
     # Save to buffer
-    buffer = BytesIO()
-    wb.save(buffer)
+    wb.close()
     buffer.seek(0)
     return buffer
 
@@ -513,8 +836,8 @@ def reclassify_fallbacks(categorized_data, progress_bar, status_text):
     status_text.text(f"Running QC on {len(fallbacks)} uncertain transactions with Senior Analyst...")
     llm = get_llm()
     
-    batch_size = 5
-    total_batches = (len(fallbacks) + batch_size - 1) // batch_size
+    batches = pack_batches(fallbacks)
+    total_batches = len(batches)
     
     system_prompt = (
         "You are a Senior Financial Analyst (QC).\n"
@@ -523,38 +846,32 @@ def reclassify_fallbacks(categorized_data, progress_bar, status_text):
         "1. \"Mechanical Hardware\" = CAPEX.\n"
         "2. Vishwanatha + Uncategorized + >1000 = CAPEX.\n"
         "3. Use context from description/narration to assign best category.\n\n"
-        "Respond with JSON: {\"type\": \"CAPEX\" or \"OPEX\", \"category\": \"assigned category\", \"reasoning\": \"brief explanation\"}"
+        "Respond with a JSON array, one object per transaction: {\"id\": transaction number, \"type\": \"CAPEX\" or \"OPEX\", \"category\": \"assigned category\", \"reasoning\": \"brief explanation\"}"
     )
 
+    batch_prompts = [batch_prompt("Re-evaluate these transactions:\n\n", batch) for batch in batches]
+    
+    def on_batch_done(done):
+        progress_bar.progress(done / total_batches)
+    
+    # All QC batches run concurrently, like the junior-analyst pass
+    batch_results = run_llm_batches(llm, system_prompt, batch_prompts, on_batch_done)
+    
     reclassified_count = 0
     
-    for i in range(0, len(fallbacks), batch_size):
-        batch = fallbacks[i:i+batch_size]
-        current_batch = i // batch_size + 1
-        progress_bar.progress(current_batch / total_batches)
+    for batch, results in zip(batches, batch_results):
+        if isinstance(results, Exception):
+            print(f"QC Error: {results}")
+            continue
         
-        batch_prompt = "Re-evaluate these transactions:\n\n"
-        for idx, txn in enumerate(batch):
-            batch_prompt += f"{idx+1}. ₹{txn['amount']:,.2f} | Cat: {txn['category']} | Desc: {txn['description'][:100]}\n"
-            
-        try:
-            response = llm.invoke([SystemMessage(content=system_prompt), HumanMessage(content=batch_prompt)])
-            content = response.content.strip().replace('```json', '').replace('```', '').strip()
-            results = json.loads(content)
-            
-            for txn, result in zip(batch, results):
-                # Update the original transaction object in the main list
-                txn['expense_type'] = result.get('type', 'OPEX')
-                txn['category'] = result.get('category', txn['category'])
-                txn['reasoning'] = f"QC (Senior Analyst): {result.get('reasoning', '')}"
-                txn['method'] = 'qc-senior'
-                txn['confidence'] = 'high'
-                reclassified_count += 1
-                
-        except Exception as e:
-            print(f"QC Error: {e}")
-            
-        time.sleep(1)
+        for txn, result in match_results(batch, results):
+            # Update the original transaction object in the main list
+            txn['expense_type'] = result.get('type', 'OPEX')
+            txn['category'] = result.get('category', txn['category'])
+            txn['reasoning'] = f"QC (Senior Analyst): {result.get('reasoning', '')}"
+            txn['method'] = 'qc-senior'
+            txn['confidence'] = 'high'
+            reclassified_count += 1
         
     return categorized_data, reclassified_count
 
@@ -564,6 +881,14 @@ def main():
     # Initialize session state
     if 'categorized_data' not in st.session_state:
         st.session_state.categorized_data = None
+    if 'excel_future' not in st.session_state:
+        st.session_state.excel_future = None
+    if 'excel_bytes' not in st.session_state:
+        st.session_state.excel_bytes = None
+    if 'report_key' not in st.session_state:
+        st.session_state.report_key = None
+    if 'report_generated' not in st.session_state:
+        st.session_state.report_generated = None
     
     # Sidebar
     with st.sidebar:
@@ -591,12 +916,31 @@ def main():
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        # Run Analysis
-        categorized_data, errors = process_files(kodo_file, trans_file, progress_bar, status_text)
-        
-        if errors:
-            for err in errors:
+        # Same uploads as an earlier run: serve its report without the LLM or a
+        # rebuild, labelled with the time it was built
+        report_key = report_cache_key(kodo_file, trans_file)
+        cached_report = load_report(report_key)
+        if cached_report:
+            for err in cached_report['errors']:
                 st.error(err)
+            st.session_state.categorized_data = cached_report['data']
+            st.session_state.excel_bytes = cached_report['xlsx']
+            st.session_state.report_generated = cached_report['generated']
+            st.session_state.excel_future = None
+            st.session_state.report_key = None
+            status_text.success(
+                f"Analysis Complete! (reused cached report generated "
+                f"{cached_report['generated'].strftime('%B %d, %Y at %I:%M %p')})"
+            )
+            progress_bar.progress(100)
+            categorized_data = None
+        else:
+            # Run Analysis
+            categorized_data, errors = process_files(kodo_file, trans_file, progress_bar, status_text)
+            
+            if errors:
+                for err in errors:
+                    st.error(err)
         
         if categorized_data:
             # Run QC
@@ -606,6 +950,10 @@ def main():
             
             # Store in session state
             st.session_state.categorized_data = categorized_data
+            st.session_state.excel_future = None
+            st.session_state.excel_bytes = None
+            st.session_state.report_key = report_key
+            st.session_state.report_errors = errors
             status_text.success("Analysis Complete!")
             progress_bar.progress(100)
     
@@ -614,31 +962,39 @@ def main():
         categorized_data = st.session_state.categorized_data
         
         # 1. Summary Metrics
-        capex = [t for t in categorized_data if t['expense_type'] == 'CAPEX']
-        opex = [t for t in categorized_data if t['expense_type'] == 'OPEX']
+        cdf = pd.DataFrame.from_records(categorized_data)
+        for column in ('description', 'reasoning'):
+            cdf[column] = cdf[column].str.slice(0, STATEMENT_TEXT_LENGTH)
+        type_totals = cdf.groupby('expense_type', sort=False)['amount'].sum()
+        totals = {
+            'count': len(cdf),
+            'total': type_totals.sum(),
+            'capex': type_totals.get('CAPEX', 0.0),
+            'opex': type_totals.get('OPEX', 0.0)
+        }
+        capex_df = cdf.loc[cdf['expense_type'] == 'CAPEX']
+        opex_df = cdf.loc[cdf['expense_type'] == 'OPEX']
+        by_category = category_totals(cdf)
         
-        capex_total = sum(t['amount'] for t in capex)
-        opex_total = sum(t['amount'] for t in opex)
+        # Build the workbook in the background, once per analysis, while the
+        # metrics and charts render
+        if st.session_state.excel_bytes is None and st.session_state.excel_future is None:
+            st.session_state.report_generated = datetime.now()
+            st.session_state.excel_future = get_report_executor().submit(
+                create_excel, capex_df, opex_df, totals, by_category, st.session_state.report_generated
+            )
         
         st.divider()
         st.subheader("📊 Financial Summary")
         m1, m2, m3 = st.columns(3)
-        with m1: st.metric("Total CAPEX", f"₹{capex_total:,.2f}")
-        with m2: st.metric("Total OPEX", f"₹{opex_total:,.2f}")
-        with m3: st.metric("Transactions", len(categorized_data))
+        with m1: st.metric("Total CAPEX", f"₹{totals['capex']:,.2f}")
+        with m2: st.metric("Total OPEX", f"₹{totals['opex']:,.2f}")
+        with m3: st.metric("Transactions", totals['count'])
         
         # 2. Download Button (moved here to persist visualizations below)
         st.divider()
-        excel_file = create_excel(categorized_data)
-        st.download_button(
-            label="📥 Download Dognosis Report (4 Sheets)",
-            data=excel_file,
-            file_name=f"Dognosis_Spend_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            type="primary",
-            use_container_width=True,
-            key="download_report_btn"
-        )
+        download_slot = st.empty()
+        download_slot.info("Building Excel report...")
         
         # 3. Category Analysis (now persistent after download)
         st.divider()
@@ -648,9 +1004,8 @@ def main():
         
         with c1:
             st.markdown("### CAPEX by Category")
-            if capex:
-                capex_df = pd.DataFrame(capex)
-                capex_chart = capex_df.groupby('category')['amount'].sum().sort_values(ascending=False)
+            if 'CAPEX' in by_category:
+                capex_chart = by_category['CAPEX']['sum'].rename('amount')
                 st.bar_chart(capex_chart)
                 st.dataframe(capex_chart.reset_index().rename(columns={'amount': 'Amount (₹)'}), use_container_width=True)
             else:
@@ -658,11 +1013,37 @@ def main():
         
         with c2:
             st.markdown("### OPEX by Category")
-            if opex:
-                opex_df = pd.DataFrame(opex)
-                opex_chart = opex_df.groupby('category')['amount'].sum().sort_values(ascending=False)
+            if 'OPEX' in by_category:
+                opex_chart = by_category['OPEX']['sum'].rename('amount')
                 st.bar_chart(opex_chart)
                 st.dataframe(opex_chart.reset_index().rename(columns={'amount': 'Amount (₹)'}), use_container_width=True)
+        
+        # Swap in the download button once the workbook is ready, and keep
+        # the finished report for the next run on the same uploads
+        if st.session_state.excel_bytes is None:
+            try:
+                excel = st.session_state.excel_future.result()
+            except Exception as e:
+                # Forget the failed build so the next rerun starts a fresh one
+                st.session_state.pop('excel_future', None)
+                download_slot.error(f"Excel report failed: {str(e)}")
+                return
+            st.session_state.excel_bytes = excel.getvalue()
+            if st.session_state.report_key:
+                save_report(
+                    st.session_state.report_key, categorized_data, st.session_state.report_errors,
+                    st.session_state.excel_bytes, st.session_state.report_generated
+                )
+                st.session_state.report_key = None
+        download_slot.download_button(
+            label="📥 Download Dognosis Report (4 Sheets)",
+            data=st.session_state.excel_bytes,
+            file_name=f"Dognosis_Spend_Report_{st.session_state.report_generated.strftime('%Y%m%d_%H%M%S')}.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            type="primary",
+            use_container_width=True,
+            key="download_report_btn"
+        )
 
 if __name__ == "__main__":
     main()
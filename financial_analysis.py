@@ -1,5 +1,6 @@
 import pandas as pd
 import numpy as np
+import re
 from datetime import datetime
 
 # File paths
@@ -7,59 +8,51 @@ KODO_PAY_FILE = "kodo-pay-reimbursement.csv"
 TRANSACTIONS_FILE = "transactions-csv.csv"
 
 # CAPEX categories - long-term investments and assets
-CAPEX_CATEGORIES = {
+CAPEX_CATEGORIES = frozenset({
     'Electronics', 'Mechanical hardware', 'IT', 'Housekeeping', 
     'Lab Work', 'Clinical Supplies'
-}
+})
 
 # CAPEX keywords in comments/narration
-CAPEX_KEYWORDS = [
+CAPEX_KEYWORDS = (
     'manufacturing', 'equipment', 'cctv', 'voltage stabilizer',
     'extension room door', 'carpenter', 'wood', 'hardware',
     'laser', 'voltage', 'stabiliser', 'wifi setup'
-]
+)
+
+# Any CAPEX keyword, matched in one pass over the text
+CAPEX_KEYWORDS_RE = re.compile('|'.join(map(re.escape, CAPEX_KEYWORDS)))
 
 # OPEX categories - day-to-day operational costs
-OPEX_CATEGORIES = {
+OPEX_CATEGORIES = frozenset({
     'Food', 'Utilities', 'Office Supplies', 'Commute', 'Travel',
     'Rent', 'Logistics', 'Fuel', 'Hotel', 'Flight Booking',
     'Grocery', 'Stationery', 'Dog Food', 'Labour', 'Grass work',
     'Clinical Referee', 'Others'
-}
+})
 
-def categorize_expense(category, comments, narration):
+def categorize_expenses(category, comments, narration):
     """
-    Categorize an expense as CAPEX or OPEX based on category and context.
+    Categorize expenses as CAPEX or OPEX based on category and context.
     
     Args:
-        category: Expense category
-        comments: Maker comments or notes
-        narration: Merchant/narration
+        category: Series of expense categories
+        comments: Series of maker comments or notes
+        narration: Series of merchant/narration text
     
     Returns:
-        'CAPEX' or 'OPEX'
+        Array of 'CAPEX', 'OPEX' or 'OPEX (Review)', one per row
     """
-    # Convert to string and lowercase for comparison
-    category_str = str(category).strip() if pd.notna(category) else ''
-    comments_str = str(comments).lower() if pd.notna(comments) else ''
-    narration_str = str(narration).lower() if pd.notna(narration) else ''
-    
-    # Check if category is explicitly CAPEX
-    if category_str in CAPEX_CATEGORIES:
-        return 'CAPEX'
+    # Convert to string and lowercase for comparison, once per column
+    category_str = category.fillna('').astype(str).str.strip()
+    combined_text = comments.fillna('').astype(str).str.lower() + ' ' + narration.fillna('').astype(str).str.lower()
     
-    # Check for CAPEX keywords in comments or narration
-    combined_text = f"{comments_str} {narration_str}"
-    for keyword in CAPEX_KEYWORDS:
-        if keyword in combined_text:
-            return 'CAPEX'
-    
-    # Check if category is explicitly OPEX
-    if category_str in OPEX_CATEGORIES:
-        return 'OPEX'
+    # CAPEX by category or keyword, then OPEX by category
+    is_capex = category_str.isin(CAPEX_CATEGORIES) | combined_text.str.contains(CAPEX_KEYWORDS_RE)
+    is_opex = category_str.isin(OPEX_CATEGORIES)
     
     # Default to OPEX for unclear cases (can be reviewed)
-    return 'OPEX (Review)'
+    return np.select([is_capex, is_opex], ['CAPEX', 'OPEX'], default='OPEX (Review)')
 
 def analyze_kodo_pay(file_path):
     """Analyze kodo-pay sheet and categorize expenses."""
@@ -76,13 +69,10 @@ def analyze_kodo_pay(file_path):
     print(f"Debit transactions (after filtering credits): {len(df_debit)}")
     
     # Categorize each transaction
-    df_debit['Expense_Type'] = df_debit.apply(
-        lambda row: categorize_expense(
-            row['Category'], 
-            row['Maker Comments'], 
-            row['Narration on Kodo Pay']
-        ), 
-        axis=1
+    df_debit['Expense_Type'] = categorize_expenses(
+        df_debit['Category'],
+        df_debit['Maker Comments'],
+        df_debit['Narration on Kodo Pay']
     )
     
     # Add source column
@@ -105,13 +95,10 @@ def analyze_transactions(file_path):
     print(f"Debit transactions (after filtering credits): {len(df_debit)}")
     
     # Categorize each transaction
-    df_debit['Expense_Type'] = df_debit.apply(
-        lambda row: categorize_expense(
-            row['Expense Category'], 
-            row['Notes'], 
-            row['Merchant/Narration']
-        ), 
-        axis=1
+    df_debit['Expense_Type'] = categorize_expenses(
+        df_debit['Expense Category'],
+        df_debit['Notes'],
+        df_debit['Merchant/Narration']
     )
     
     # Add source column
@@ -119,39 +106,36 @@ def analyze_transactions(file_path):
     
     return df_debit
 
+def as_text(series):
+    """Return a column as strings, with blanks for missing values."""
+    return series.fillna('').astype(str)
+
 def generate_summary(kodo_df, trans_df):
     """Generate summary statistics and reports."""
     print(f"\n{'='*80}")
     print("FINANCIAL ANALYSIS SUMMARY")
     print(f"{'='*80}\n")
     
-    # Combine both datasets for summary
-    all_expenses = []
-    
-    # Process Kodo-Pay data
-    for _, row in kodo_df.iterrows():
-        all_expenses.append({
-            'Source': 'Kodo-Pay',
-            'Date': row['Date (IST)'],
-            'Amount': row['Net Txn Amount Debit (INR)'],
-            'Category': row['Category'],
-            'Expense_Type': row['Expense_Type'],
-            'Description': f"{row['Outward Payment Beneficiary Name']} - {row['Maker Comments']}"
-        })
-    
-    # Process Transactions data
-    for _, row in trans_df.iterrows():
-        all_expenses.append({
-            'Source': 'Transactions',
-            'Date': row['Txn Date'],
-            'Amount': row['Net Txn Amount Debit (Rs.)'],
-            'Category': row['Expense Category'],
-            'Expense_Type': row['Expense_Type'],
-            'Description': f"{row['Merchant/Narration']} - {row['Notes']}"
-        })
+    # Combine both datasets for summary, one column-wise frame per source
+    kodo_expenses = pd.DataFrame({
+        'Source': 'Kodo-Pay',
+        'Date': kodo_df['Date (IST)'],
+        'Amount': kodo_df['Net Txn Amount Debit (INR)'],
+        'Category': kodo_df['Category'],
+        'Expense_Type': kodo_df['Expense_Type'],
+        'Description': as_text(kodo_df['Outward Payment Beneficiary Name']) + ' - ' + as_text(kodo_df['Maker Comments'])
+    })
+    trans_expenses = pd.DataFrame({
+        'Source': 'Transactions',
+        'Date': trans_df['Txn Date'],
+        'Amount': trans_df['Net Txn Amount Debit (Rs.)'],
+        'Category': trans_df['Expense Category'],
+        'Expense_Type': trans_df['Expense_Type'],
+        'Description': as_text(trans_df['Merchant/Narration']) + ' - ' + as_text(trans_df['Notes'])
+    })
     
     # Create summary DataFrame
-    summary_df = pd.DataFrame(all_expenses)
+    summary_df = pd.concat([kodo_expenses, trans_expenses], ignore_index=True)
     
     # Calculate totals
     total_capex = summary_df[summary_df['Expense_Type'] == 'CAPEX']['Amount'].sum()
@@ -1,19 +1,94 @@
 import os
 import pandas as pd
-from typing import TypedDict, List, Dict
+import numpy as np
+from typing import TypedDict, List, Dict, Literal
+from pydantic import BaseModel, Field
 from langgraph.graph import StateGraph, END
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, SystemMessage
-import json
+from langchain_core.rate_limiters import InMemoryRateLimiter
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import re
+import diskcache
 from datetime import datetime
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-import time
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
+from orjson_disk import OrjsonDisk
+
+# LLM batches in flight at once
+LLM_CONCURRENCY = 4
+
+# Batches are packed up to a prompt token budget, estimated from character count
+LLM_BATCH_TOKEN_BUDGET = 8000
+LLM_MAX_BATCH_SIZE = 50
+CHARS_PER_TOKEN = 4
+
+# Gemini request quota (free tier), enforced by a token bucket on the client
+LLM_REQUESTS_PER_MINUTE = 15
+
+# Parse the input CSVs with pyarrow's multi-threaded reader (False falls back to pandas' C parser)
+USE_PYARROW = True
+
+# Columns read from each sheet: free text (kept exactly as written), low-cardinality
+# labels (stored as category codes) and amounts
+KODO_TEXT_COLUMNS = ['Date (IST)', 'Narration on Kodo Pay', 'Maker Comments']
+KODO_CATEGORY_COLUMNS = ['Dr/Cr', 'Category', 'Maker Name', 'Outward Payment Status']
+KODO_AMOUNT_COLUMNS = ['Txn Amount (INR)']
+TRANS_TEXT_COLUMNS = ['Txn Date', 'Merchant/Narration', 'Notes']
+TRANS_CATEGORY_COLUMNS = ['Txn Category', 'Expense Category', 'Cardholder First Name', 'Cardholder Last Name']
+TRANS_AMOUNT_COLUMNS = ['Txn Amount (Rs.)']
+
+# On-disk cache of LLM categorizations, reused by later runs on similar transactions
+LLM_CACHE = diskcache.Cache(".langgraph_cache", disk=OrjsonDisk)
+
+# Columns of the combined transaction frame; each sheet leaves the other's own columns blank
+TRANSACTION_COLUMNS = [
+    'source', 'date', 'amount', 'category', 'narration', 'comments',
+    'maker_name', 'merchant', 'cardholder', 'description'
+]
+
+# Columns a categorization sets on a transaction
+CATEGORIZATION_COLUMNS = ['category', 'original_category', 'expense_type', 'confidence', 'reasoning', 'method']
+
+# Categorized transactions from the last run, reused for rows that haven't changed
+RESULTS_PATH = ".langgraph_results.parquet"
+
+# Business-rule patterns, matched case-insensitively
+MECHANICAL_HW_RE = re.compile(r'mechanical hardware', re.IGNORECASE)
+VISHWANATH_RE = re.compile(r'vishwanath', re.IGNORECASE)
+
+# Runs of whitespace, collapsed when normalizing cache key text
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Report styles, built once and shared by every cell that uses them
+HEADER_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+HEADER_FONT = Font(color="FFFFFF", bold=True, size=12)
+TITLE_FONT = Font(bold=True, size=16)
+SUBTITLE_FONT = Font(bold=True, size=12)
+TOTAL_FONT = Font(bold=True)
+BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+LEFT_ALIGN = Alignment(horizontal='left')
+RIGHT_ALIGN = Alignment(horizontal='right')
+WRAP_ALIGN = Alignment(horizontal='left', wrap_text=True)
+CURRENCY_FORMAT = '₹#,##0.00'
+PERCENT_FORMAT = '0.0%'
+
+# Column widths (A-G) of the CAPEX and OPEX statement sheets
+STATEMENT_COLUMN_WIDTHS = (12, 15, 20, 18, 35, 15, 40)
 
 # State definition
 class FinancialAnalysisState(TypedDict):
-    raw_transactions: List[Dict]
-    categorized_transactions: List[Dict]
+    raw_transactions: pd.DataFrame
+    categorized_transactions: pd.DataFrame
     capex_total: float
     opex_total: float
     capex_by_category: Dict[str, float]
@@ -22,7 +97,17 @@ class FinancialAnalysisState(TypedDict):
     errors: List[str]
     stats: Dict[str, int]
 
-# Initialize LLM - Gemini 2.5 Flash
+# Structured LLM reply: one categorization per transaction in the batch, tagged with its number
+class CategorizationResult(BaseModel):
+    id: int = Field(description="the transaction's number in the list")
+    type: Literal['CAPEX', 'OPEX']
+    category: str = Field(description="assigned category name (use existing if not Uncategorized)")
+    reasoning: str = Field(description="brief explanation")
+
+class CategorizationBatch(BaseModel):
+    items: List[CategorizationResult]
+
+# Initialize LLM - Gemini 2.5 Flash, replying with a parsed CategorizationBatch
 def get_llm():
     api_key = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY')
     if not api_key:
@@ -32,87 +117,115 @@ def get_llm():
         google_api_key=api_key,
         temperature=0.1,
         max_retries=2,
-        request_timeout=60
+        request_timeout=60,
+        rate_limiter=InMemoryRateLimiter(
+            requests_per_second=LLM_REQUESTS_PER_MINUTE / 60,
+            max_bucket_size=LLM_CONCURRENCY
+        )
+    ).with_structured_output(CategorizationBatch)
+
+def read_csv(path, text_columns, category_columns, amount_columns):
+    """Read a CSV with fixed dtypes for the columns used, via pyarrow when USE_PYARROW is set."""
+    dtype = {
+        **{c: str for c in text_columns},
+        **{c: 'category' for c in category_columns},
+        **{c: 'float64' for c in amount_columns}
+    }
+    if USE_PYARROW:
+        return pd.read_csv(path, dtype=dtype, engine='pyarrow', dtype_backend='pyarrow')
+    return pd.read_csv(path, dtype=dtype)
+
+def as_text(series, default=''):
+    """Return a text or category column as strings, with `default` for missing values."""
+    return series.astype(str).where(series.notna(), default)
+
+def mentions_lq_prepaid(*columns):
+    """Mask of rows where any of the text columns mention LQ Prepaid (internal transfers)."""
+    mask = False
+    for column in columns:
+        mask = mask | column.str.lower().str.contains('lq prepaid', regex=False)
+    return mask
+
+def load_kodo():
+    """Kodo-Pay debits as a transaction frame, without LQ Prepaid transfers."""
+    kodo_df = read_csv("kodo-pay-reimbursement.csv", KODO_TEXT_COLUMNS, KODO_CATEGORY_COLUMNS, KODO_AMOUNT_COLUMNS)
+    kodo_debit = kodo_df[kodo_df['Dr/Cr'] == 'Dr']
+    
+    kodo = pd.DataFrame({
+        'source': 'Kodo-Pay',
+        'date': as_text(kodo_debit['Date (IST)']),
+        'amount': kodo_debit['Txn Amount (INR)'].fillna(0).astype(float),
+        'category': as_text(kodo_debit['Category'], 'Uncategorized'),
+        'narration': as_text(kodo_debit['Narration on Kodo Pay']),
+        'comments': as_text(kodo_debit['Maker Comments']),
+        'maker_name': as_text(kodo_debit['Maker Name'])
+    })
+    kodo['description'] = kodo['narration'].str.cat(
+        [kodo['category'], kodo['comments'], kodo['maker_name'], as_text(kodo_debit['Outward Payment Status'])],
+        sep=' | '
+    )
+    
+    # FILTER: Skip LQ Prepaid transactions (internal transfers)
+    return kodo[~mentions_lq_prepaid(kodo['narration'], kodo['comments'])]
+
+def load_card_transactions():
+    """Transactions-sheet debits as a transaction frame, without LQ Prepaid transfers."""
+    trans_df = read_csv("transactions-csv.csv", TRANS_TEXT_COLUMNS, TRANS_CATEGORY_COLUMNS, TRANS_AMOUNT_COLUMNS)
+    trans_debit = trans_df[~trans_df['Txn Category'].isin(['FUNDING', 'CARD_CREDIT'])]
+    
+    merchant = as_text(trans_debit['Merchant/Narration'])
+    first_name = trans_debit['Cardholder First Name']
+    cardholder = as_text(first_name).str.cat(as_text(trans_debit['Cardholder Last Name']), sep=' ').str.strip()
+    trans = pd.DataFrame({
+        'source': 'Transactions',
+        'date': as_text(trans_debit['Txn Date']),
+        'amount': trans_debit['Txn Amount (Rs.)'].fillna(0).astype(float),
+        'category': as_text(trans_debit['Expense Category'], 'Uncategorized'),
+        'merchant': merchant,
+        'narration': merchant,
+        'comments': as_text(trans_debit['Notes']),
+        'cardholder': cardholder.where(first_name.notna(), '')
+    })
+    trans['description'] = trans['merchant'].str.cat(
+        [trans['category'], trans['comments'], trans['cardholder'], as_text(trans_debit['Txn Category'])],
+        sep=' | '
     )
+    
+    # FILTER: Skip LQ Prepaid transactions (internal transfers)
+    return trans[~mentions_lq_prepaid(trans['merchant'])]
 
 # Node 1: Load data with FILTERING
 def load_data(state: FinancialAnalysisState) -> FinancialAnalysisState:
     print("\n[1/4] Loading and filtering data...")
     
-    transactions = []
-    
-    # Kodo-Pay Sheet
-    try:
-        kodo_df = pd.read_csv("kodo-pay-reimbursement.csv")
-        kodo_debit = kodo_df[kodo_df['Dr/Cr'] == 'Dr'].copy()
-        
-        for _, row in kodo_debit.iterrows():
-            date = str(row['Date (IST)']) if pd.notna(row['Date (IST)']) else ''
-            amount = float(row['Txn Amount (INR)']) if pd.notna(row['Txn Amount (INR)']) else 0.0
-            narration = str(row['Narration on Kodo Pay']) if pd.notna(row['Narration on Kodo Pay']) else ''
-            category = str(row['Category']) if pd.notna(row['Category']) else 'Uncategorized'
-            comments = str(row['Maker Comments']) if pd.notna(row['Maker Comments']) else ''
-            maker_name = str(row['Maker Name']) if pd.notna(row['Maker Name']) else ''
-            status = str(row['Outward Payment Status']) if pd.notna(row['Outward Payment Status']) else ''
-            
-            # FILTER: Skip LQ Prepaid transactions (internal transfers)
-            if 'lq prepaid' in narration.lower() or 'lq prepaid' in comments.lower():
-                continue
-            
-            full_description = f"{narration} | {category} | {comments} | {maker_name} | {status}"
-            
-            transactions.append({
-                'source': 'Kodo-Pay',
-                'date': date,
-                'amount': amount,
-                'category': category,
-                'narration': narration,
-                'comments': comments,
-                'maker_name': maker_name,
-                'description': full_description
-            })
-        print(f"  ✓ Kodo-Pay: {len(transactions)} transactions (filtered out LQ Prepaid)")
-    except Exception as e:
-        state['errors'].append(f"Kodo-Pay error: {str(e)}")
+    frames = []
     
-    # Transactions Sheet
-    try:
-        trans_df = pd.read_csv("transactions-csv.csv")
-        trans_debit = trans_df[~trans_df['Txn Category'].isin(['FUNDING', 'CARD_CREDIT'])].copy()
-        
-        initial_count = len(transactions)
+    # Read and parse both sheets at once; results are still taken in sheet order
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        kodo_future = executor.submit(load_kodo)
+        trans_future = executor.submit(load_card_transactions)
         
-        for _, row in trans_debit.iterrows():
-            merchant = str(row['Merchant/Narration']) if pd.notna(row['Merchant/Narration']) else ''
-            
-            # FILTER: Skip LQ Prepaid transactions (internal transfers)
-            if 'lq prepaid' in merchant.lower():
-                continue
-            
-            cardholder = f"{row['Cardholder First Name']} {row['Cardholder Last Name']}" if pd.notna(row['Cardholder First Name']) else ''
-            date = str(row['Txn Date']) if pd.notna(row['Txn Date']) else ''
-            txn_category = str(row['Txn Category']) if pd.notna(row['Txn Category']) else ''
-            amount = float(row['Txn Amount (Rs.)']) if pd.notna(row['Txn Amount (Rs.)']) else 0.0
-            category = str(row['Expense Category']) if pd.notna(row['Expense Category']) else 'Uncategorized'
-            notes = str(row['Notes']) if pd.notna(row['Notes']) else ''
-            
-            full_description = f"{merchant} | {category} | {notes} | {cardholder} | {txn_category}"
-            
-            transactions.append({
-                'source': 'Transactions',
-                'date': date,
-                'amount': amount,
-                'category': category,
-                'merchant': merchant,
-                'narration': merchant,
-                'comments': notes,
-                'cardholder': cardholder,
-                'description': full_description
-            })
+        # Kodo-Pay Sheet
+        try:
+            kodo = kodo_future.result()
+            frames.append(kodo)
+            print(f"  ✓ Kodo-Pay: {len(kodo)} transactions (filtered out LQ Prepaid)")
+        except Exception as e:
+            state['errors'].append(f"Kodo-Pay error: {str(e)}")
         
-        print(f"  ✓ Transactions: {len(transactions) - initial_count} transactions (filtered out LQ Prepaid)")
-    except Exception as e:
-        state['errors'].append(f"Transactions error: {str(e)}")
+        # Transactions Sheet
+        try:
+            trans = trans_future.result()
+            frames.append(trans)
+            print(f"  ✓ Transactions: {len(trans)} transactions (filtered out LQ Prepaid)")
+        except Exception as e:
+            state['errors'].append(f"Transactions error: {str(e)}")
+    
+    # One frame for both sheets, Kodo-Pay rows first
+    if frames:
+        transactions = pd.concat(frames, ignore_index=True).reindex(columns=TRANSACTION_COLUMNS)
+    else:
+        transactions = pd.DataFrame(columns=TRANSACTION_COLUMNS)
     
     state['raw_transactions'] = transactions
     state['errors'] = state.get('errors', [])
@@ -125,62 +238,76 @@ def categorize_with_llm(state: FinancialAnalysisState) -> FinancialAnalysisState
     print(f"[2/4] Applying business rules + LLM for {len(state['raw_transactions'])} transactions...")
     
     llm = get_llm()
-    categorized = []
-    llm_needed = []
     
     # BUSINESS-SPECIFIC RULES (applied first)
     print("  → Applying business-specific rules...")
-    rule_based_count = 0
-    
-    for txn in state['raw_transactions']:
-        category = txn.get('category', '').lower()
-        description = txn.get('description', '').lower()
-        narration = txn.get('narration', '').lower()
-        comments = txn.get('comments', '').lower()
-        maker_name = txn.get('maker_name', '').lower()
-        
-        all_text = f"{category} {description} {narration} {comments}"
-        
-        # RULE 1: Mechanical Hardware = CAPEX (hardware company)
-        if 'mechanical hardware' in category or 'mechanical hardware' in all_text:
-            categorized.append({
-                **txn,
-                'original_category': txn['category'],
-                'expense_type': 'CAPEX',
-                'confidence': 'high',
-                'reasoning': 'Business Rule: Mechanical Hardware is long-term investment (hardware company)',
-                'method': 'business-rule'
-            })
-            rule_based_count += 1
-            continue
-        
-        # RULE 2: Mister Vishwanatha + Uncategorized + >1000 = CAPEX
-        if ('vishwanatha' in maker_name or 'vishwanath' in maker_name) and txn['category'] == 'Uncategorized' and txn['amount'] > 1000:
-            categorized.append({
-                **txn,
-                'original_category': txn['category'],
-                'category': 'Capital Investment',  # Assign category
-                'expense_type': 'CAPEX',
-                'confidence': 'high',
-                'reasoning': 'Business Rule: Vishwanatha uncategorized expenses > 1000 → CAPEX (Equipment)',
-                'method': 'business-rule'
-            })
-            rule_based_count += 1
-            continue
-        
-        # Not matched by business rules, needs LLM
-        llm_needed.append(txn)
     
-    print(f"  ✓ Business rules: {rule_based_count} transactions")
-    print(f"  → LLM analysis: {len(llm_needed)} transactions\n")
+    # Every row starts uncategorized; each step below fills in the rows it settles
+    rt = state['raw_transactions']
+    previous = load_previous_results(state)
+    df = rt.assign(
+        row_hash=row_hashes(rt), original_category=rt['category'],
+        expense_type=None, confidence=None, reasoning=None, method=None
+    )
     
-    # LLM categorization for remaining transactions
-    if len(llm_needed) == 0:
-        state['categorized_transactions'] = categorized
-        state['stats']['llm_categorized'] = 0
-        state['stats']['business_rules'] = rule_based_count
-        return state
+    # Unchanged since the last run: keep its categorization
+    reused = df['row_hash'].isin(previous.index).to_numpy()
+    if reused.any():
+        df.loc[reused, CATEGORIZATION_COLUMNS] = previous.loc[df['row_hash'][reused], CATEGORIZATION_COLUMNS].to_numpy()
+    
+    mechanical_hw, vishwanatha = business_rule_masks(df)
+    mechanical_hw = mechanical_hw & ~reused
+    vishwanatha = vishwanatha & ~reused
+    
+    # RULE 1: Mechanical Hardware = CAPEX (hardware company)
+    set_columns(
+        df, mechanical_hw,
+        expense_type='CAPEX',
+        confidence='high',
+        reasoning='Business Rule: Mechanical Hardware is long-term investment (hardware company)',
+        method='business-rule'
+    )
     
+    # RULE 2: Mister Vishwanatha + Uncategorized + >1000 = CAPEX
+    set_columns(
+        df, vishwanatha,
+        category='Capital Investment',  # Assign category
+        expense_type='CAPEX',
+        confidence='high',
+        reasoning='Business Rule: Vishwanatha uncategorized expenses > 1000 → CAPEX (Equipment)',
+        method='business-rule'
+    )
+    
+    # Same category, narration and amount bucket as an earlier LLM answer
+    pending = ~(reused | mechanical_hw | vishwanatha)
+    answers = [
+        LLM_CACHE.get(llm_cache_key(*row))
+        for row in df.loc[pending, ['category', 'narration', 'amount']].itertuples(index=False, name=None)
+    ]
+    cached = np.zeros(len(df), dtype=bool)
+    cached[pending] = [bool(answer) for answer in answers]
+    hits = [answer for answer in answers if answer]
+    set_columns(
+        df, cached,
+        category=[hit['category'] for hit in hits],
+        expense_type=[hit['expense_type'] for hit in hits],
+        confidence='llm',
+        reasoning=[hit['reasoning'] for hit in hits],
+        method='cache'
+    )
+    
+    # Not matched by business rules, needs LLM
+    llm_needed = pending & ~cached
+    reused_count = int(reused.sum())
+    rule_based_count = int(mechanical_hw.sum() + vishwanatha.sum())
+    cached_count = int(cached.sum())
+    
+    print(f"  ✓ Unchanged since last run: {reused_count} transactions")
+    print(f"  ✓ Business rules: {rule_based_count} transactions")
+    print(f"  ✓ Cache hits: {cached_count} transactions")
+    print(f"  → LLM analysis: {int(llm_needed.sum())} transactions\n")
+    
+    # LLM categorization for remaining transactions (none when rules and cache cover everything)
     # Enhanced prompt with specific business rules
     system_prompt = """You are a financial analyst for a HARDWARE COMPANY.
 
@@ -205,89 +332,28 @@ Common Categories:
 - Electronics, Mechanical Hardware, IT, Lab Work, Construction
 - Logistics, Labour, Dog Care, Maintenance
 
-Respond with JSON: {
-  "type": "CAPEX" or "OPEX",
-  "category": "assigned category name (use existing if not Uncategorized)",
-  "reasoning": "brief explanation"
-}"""
+Return one item per transaction with its id (the transaction's number), type
+(CAPEX or OPEX), category and reasoning."""
 
-    batch_size = 5
-    delay = 3
-    total = len(llm_needed)
-    llm_categorized = []
-    
-    for i in range(0, total, batch_size):
-        batch = llm_needed[i:i+batch_size]
-        
-        batch_prompt = "Categorize and assign proper categories:\n\n"
-        for idx, txn in enumerate(batch):
-            maker_info = f"Maker: {txn.get('maker_name', 'N/A')}" if txn.get('maker_name') else f"Cardholder: {txn.get('cardholder', 'N/A')}"
-            batch_prompt += f"{idx+1}. ₹{txn['amount']:,.2f}\n"
-            batch_prompt += f"   Current Category: {txn['category']}\n"
-            batch_prompt += f"   {maker_info}\n"
-            batch_prompt += f"   Description: {txn['description'][:120]}\n\n"
-        
-        try:
-            messages = [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=batch_prompt)
-            ]
-            
-            response = llm.invoke(messages)
-            
-            content = response.content.strip()
-            if content.startswith('```json'):
-                content = content.split('```json')[1].split('```')[0].strip()
-            elif content.startswith('```'):
-                content = content.split('```')[1].split('```')[0].strip()
-            
-            results = json.loads(content)
-            
-            for txn, result in zip(batch, results):
-                # Use LLM-assigned category if original was Uncategorized
-                assigned_category = result.get('category', txn['category'])
-                if txn['category'] == 'Uncategorized' and assigned_category != 'Uncategorized':
-                    category_note = f" (LLM assigned: {assigned_category})"
-                else:
-                    category_note = ""
-                
-                llm_categorized.append({
-                    **txn,
-                    'category': assigned_category,  # Update category
-                    'original_category': txn['category'],  # Keep original
-                    'expense_type': result.get('type', 'OPEX'),
-                    'confidence': 'llm',
-                    'reasoning': f"LLM: {result.get('reasoning', '')}{category_note}",
-                    'method': 'pure-llm'
-                })
-                    
-        except Exception as e:
-            print(f"  ⚠ Batch failed: {str(e)}, using fallback")
-            for txn in batch:
-                llm_categorized.append({
-                    **txn,
-                    'original_category': txn['category'],
-                    'expense_type': 'OPEX',
-                    'confidence': 'low',
-                    'reasoning': f'Error: {str(e)}',
-                    'method': 'error-fallback'
-                })
-        
-        current = min(i + batch_size, total)
-        print(f"  Progress: {current}/{total}")
-        
-        if i + batch_size < total:
-            time.sleep(delay)
+    batches = pack_batches(to_records(df[llm_needed]))
+    llm_categorized = pd.DataFrame.from_records([
+        txn
+        for batch_result in asyncio.run(categorize_batches(llm, system_prompt, batches))
+        for txn in batch_result
+    ], columns=df.columns).astype({'row_hash': df['row_hash'].dtype})
     
     # Combine business-rule and LLM categorized transactions
-    all_categorized = categorized + llm_categorized
+    all_categorized = pd.concat([df[~llm_needed], llm_categorized], ignore_index=True)
     state['categorized_transactions'] = all_categorized
     state['stats']['llm_categorized'] = len(llm_categorized)
     state['stats']['business_rules'] = rule_based_count
+    state['stats']['cached'] = cached_count
+    state['stats']['reused'] = reused_count
+    save_results(state, all_categorized)
     
     # Count originally uncategorized that were assigned categories
-    originally_uncategorized = len([t for t in all_categorized if t.get('original_category') == 'Uncategorized'])
-    still_uncategorized = len([t for t in all_categorized if t['category'] == 'Uncategorized'])
+    originally_uncategorized = int((all_categorized['original_category'] == 'Uncategorized').sum())
+    still_uncategorized = int((all_categorized['category'] == 'Uncategorized').sum())
     assigned_categories = originally_uncategorized - still_uncategorized
     
     state['stats']['uncategorized_original'] = originally_uncategorized
@@ -295,7 +361,9 @@ Respond with JSON: {
     state['stats']['uncategorized_remaining'] = still_uncategorized
     
     print(f"  ✓ Complete")
+    print(f"  ✓ Reused: {reused_count}")
     print(f"  ✓ Business Rules: {rule_based_count}")
+    print(f"  ✓ Cache Hits: {cached_count}")
     print(f"  ✓ LLM Categorized: {len(llm_categorized)}")
     print(f"  ✓ Originally Uncategorized: {originally_uncategorized}")
     print(f"  ✓ LLM Assigned Categories: {assigned_categories}")
@@ -303,25 +371,220 @@ Respond with JSON: {
     
     return state
 
+def set_columns(df, mask, **values):
+    """Set each named column of `df` to its value (a scalar, or one per row) on the rows in `mask`."""
+    for column, value in values.items():
+        df.loc[mask, column] = value
+
+def to_records(df):
+    """Rows of `df` as dicts, without the columns left blank for that row (such as the other sheet's fields)."""
+    return [{k: v for k, v in row.items() if pd.notna(v)} for row in df.to_dict('records')]
+
+def row_hashes(rt):
+    """A 64-bit hash per transaction of the fields that identify it in the input sheets."""
+    return pd.util.hash_pandas_object(rt[['source', 'date', 'amount', 'description']], index=False)
+
+def load_previous_results(state):
+    """
+    The last run's categorized transactions indexed by row hash, minus error
+    fallbacks (so those go back to the LLM). Empty if there is no saved run.
+    """
+    if not os.path.exists(RESULTS_PATH):
+        return pd.DataFrame()
+    try:
+        saved = pd.read_parquet(RESULTS_PATH, columns=['row_hash', *CATEGORIZATION_COLUMNS])
+        
+        # Identical rows share a hash, and so a categorization
+        saved = saved[saved['method'] != 'error-fallback']
+        return saved.drop_duplicates('row_hash', keep='last').set_index('row_hash')
+    except Exception as e:
+        # Unreadable, or written by another version: skip it rather than fail the run
+        state['errors'].append(f"Previous results unusable, recategorizing everything: {str(e)}")
+        return pd.DataFrame()
+
+def save_results(state, categorized):
+    """Save this run's categorized transactions for the next run to reuse."""
+    try:
+        categorized.to_parquet(RESULTS_PATH, index=False)
+    except Exception as e:
+        state['errors'].append(f"Could not save results for the next run: {str(e)}")
+
+def business_rule_masks(rt):
+    """
+    Evaluate both business rules over all transactions at once: boolean arrays
+    for Rule 1 (Mechanical Hardware anywhere in the description, which already
+    holds the category, narration and comments) and Rule 2 (Vishwanatha +
+    Uncategorized + amount > 1000, only where Rule 1 didn't match).
+    """
+    mechanical_hw = rt['description'].str.contains(MECHANICAL_HW_RE).to_numpy(dtype=bool)
+    
+    # Cheap category/amount checks first; the name pattern only runs on the rows
+    # that pass them and weren't already taken by Rule 1
+    vishwanatha = ((rt['category'] == 'Uncategorized') & (rt['amount'] > 1000)).to_numpy(dtype=bool) & ~mechanical_hw
+    vishwanatha[vishwanatha] = rt['maker_name'][vishwanatha].fillna('').str.contains(VISHWANATH_RE).to_numpy(dtype=bool)
+    return mechanical_hw, vishwanatha
+
+def llm_cache_key(category, narration, amount):
+    """
+    Key an LLM categorization on the normalized original category, narration
+    and amount rounded to the nearest 100, so repeat purchases share an answer.
+    """
+    narration = WHITESPACE_RE.sub(' ', narration[:80].lower()).strip()
+    text = f"{category.lower()}|{narration}|{round(amount, -2)}"
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+def transaction_prompt(txn):
+    """One transaction's entry in a batch prompt (after its number)."""
+    maker_info = f"Maker: {txn.get('maker_name', 'N/A')}" if txn.get('maker_name') else f"Cardholder: {txn.get('cardholder', 'N/A')}"
+    return (
+        f"₹{txn['amount']:,.2f}\n"
+        f"   Current Category: {txn['category']}\n"
+        f"   {maker_info}\n"
+        f"   Description: {txn['description'][:120]}\n\n"
+    )
+
+def pack_batches(txns):
+    """
+    Greedily pack transactions, in order, into LLM batches of up to
+    LLM_BATCH_TOKEN_BUDGET estimated prompt tokens (and at most
+    LLM_MAX_BATCH_SIZE transactions).
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for txn in txns:
+        tokens = len(transaction_prompt(txn)) // CHARS_PER_TOKEN + 1
+        if batch and (batch_tokens + tokens > LLM_BATCH_TOKEN_BUDGET or len(batch) >= LLM_MAX_BATCH_SIZE):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(txn)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+def batch_messages(system_prompt, batch):
+    """The LLM messages for one batch: the system prompt and the numbered transactions."""
+    batch_prompt = "Categorize and assign proper categories:\n\n"
+    for idx, txn in enumerate(batch):
+        batch_prompt += f"{idx+1}. {transaction_prompt(txn)}"
+    return [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=batch_prompt)
+    ]
+
+def cache_llm_results(categorized):
+    """Remember a batch's successful LLM answers for later runs."""
+    for txn in categorized:
+        if txn['method'] == 'pure-llm':
+            LLM_CACHE.set(llm_cache_key(txn['original_category'], txn['narration'], txn['amount']), {
+                'expense_type': txn['expense_type'],
+                'category': txn['category'],
+                'reasoning': txn['reasoning']
+            })
+
+def fallback_categorization(txn, reason):
+    """Low-confidence OPEX categorization for a transaction the LLM didn't answer."""
+    return {
+        **txn,
+        'original_category': txn['category'],
+        'expense_type': 'OPEX',
+        'confidence': 'low',
+        'reasoning': f'Error: {reason}',
+        'method': 'error-fallback'
+    }
+
+async def categorize_batch(llm, messages, batch):
+    """
+    Categorize one batch with a single LLM call, pairing each answer with its
+    transaction by the id (prompt line number) it echoes back. Transactions left
+    without an answer, or the whole batch if the call fails, get OPEX fallbacks.
+    """
+    try:
+        parsed = await llm.ainvoke(messages)
+        by_id = {}
+        for result in parsed.items:
+            by_id.setdefault(result.id, result)
+    except Exception as e:
+        print(f"  ⚠ Batch failed: {str(e)}, using fallback")
+        return [fallback_categorization(txn, str(e)) for txn in batch]
+    
+    categorized = []
+    for idx, txn in enumerate(batch, 1):
+        result = by_id.get(idx)
+        if result is None:
+            categorized.append(fallback_categorization(txn, 'no LLM answer for this transaction'))
+            continue
+        
+        # Use LLM-assigned category if original was Uncategorized
+        assigned_category = result.category
+        if txn['category'] == 'Uncategorized' and assigned_category != 'Uncategorized':
+            category_note = f" (LLM assigned: {assigned_category})"
+        else:
+            category_note = ""
+        
+        categorized.append({
+            **txn,
+            'category': assigned_category,  # Update category
+            'original_category': txn['category'],  # Keep original
+            'expense_type': result.type,
+            'confidence': 'llm',
+            'reasoning': f"LLM: {result.reasoning}{category_note}",
+            'method': 'pure-llm'
+        })
+    
+    missing = len(batch) - len(by_id.keys() & range(1, len(batch) + 1))
+    if missing:
+        print(f"  ⚠ {missing} of {len(batch)} transactions missing from the reply, using fallback")
+    return categorized
+
+async def categorize_batches(llm, system_prompt, batches):
+    """
+    Run every batch concurrently, at most LLM_CONCURRENCY at a time; the client's
+    rate limiter only holds a request back once the quota is used up. Results
+    keep batch order.
+    
+    A batch's prompt is built before it waits for a slot, and its answers are
+    cached after it gives the slot up, so neither holds back a request.
+    """
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+    total = sum(len(batch) for batch in batches)
+    done = 0
+    
+    async def run_batch(batch):
+        nonlocal done
+        messages = batch_messages(system_prompt, batch)
+        async with semaphore:
+            categorized = await categorize_batch(llm, messages, batch)
+        done += len(batch)
+        print(f"  Progress: {done}/{total}")
+        cache_llm_results(categorized)
+        return categorized
+    
+    return await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+def category_sums(codes, categories, amounts, mask):
+    """
+    {category: summed amount} over the rows in `mask`, accumulated by category
+    code with np.add.at, in the order categories first appear among those rows.
+    """
+    sums = np.zeros(len(categories))
+    np.add.at(sums, codes[mask], amounts[mask])
+    return {categories[code]: float(sums[code]) for code in pd.unique(codes[mask])}
+
 # Node 3: Calculate totals
 def calculate_totals(state: FinancialAnalysisState) -> FinancialAnalysisState:
     print("[3/4] Calculating...")
     
-    capex_total = 0
-    opex_total = 0
-    capex_by_cat = {}
-    opex_by_cat = {}
+    # Category codes + amount arrays; anything not CAPEX counts as OPEX
+    txns = state['categorized_transactions']
+    amounts = txns['amount'].to_numpy(dtype=np.float64)
+    is_capex = (txns['expense_type'] == 'CAPEX').to_numpy(dtype=bool)
+    codes, categories = pd.factorize(txns['category'])
     
-    for txn in state['categorized_transactions']:
-        amount = txn['amount']
-        category = txn['category']
-        
-        if txn['expense_type'] == 'CAPEX':
-            capex_total += amount
-            capex_by_cat[category] = capex_by_cat.get(category, 0) + amount
-        else:
-            opex_total += amount
-            opex_by_cat[category] = opex_by_cat.get(category, 0) + amount
+    capex_by_cat = category_sums(codes, categories, amounts, is_capex)
+    opex_by_cat = category_sums(codes, categories, amounts, ~is_capex)
+    capex_total = sum(capex_by_cat.values())
+    opex_total = sum(opex_by_cat.values())
     
     state['capex_total'] = capex_total
     state['opex_total'] = opex_total
@@ -333,215 +596,195 @@ def calculate_totals(state: FinancialAnalysisState) -> FinancialAnalysisState:
     
     return state
 
+def add_report_styles(wb):
+    """Register the named styles shared by the report's table cells (in the workbook's default font)."""
+    wb.add_named_style(NamedStyle(name='report_header', font=HEADER_FONT, fill=HEADER_FILL, border=BORDER))
+    wb.add_named_style(NamedStyle(name='statement_text', font=DEFAULT_FONT, border=BORDER, alignment=WRAP_ALIGN))
+    wb.add_named_style(NamedStyle(name='statement_amount', font=DEFAULT_FONT, border=BORDER, alignment=WRAP_ALIGN, number_format=CURRENCY_FORMAT))
+    wb.add_named_style(NamedStyle(name='category_text', font=DEFAULT_FONT, border=BORDER))
+    wb.add_named_style(NamedStyle(name='category_amount', font=DEFAULT_FONT, border=BORDER, number_format=CURRENCY_FORMAT))
+    wb.add_named_style(NamedStyle(name='category_percent', font=DEFAULT_FONT, border=BORDER, number_format=PERCENT_FORMAT))
+
+def named_cell(ws, value, style):
+    """A write-only cell for `ws` using one of the add_report_styles() styles."""
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+def styled_cell(ws, value, font=None, fill=None, border=None, alignment=None, number_format=None):
+    """A write-only cell for `ws` carrying the given styles."""
+    cell = WriteOnlyCell(ws, value=value)
+    if font:
+        cell.font = font
+    if fill:
+        cell.fill = fill
+    if border:
+        cell.border = border
+    if alignment:
+        cell.alignment = alignment
+    if number_format:
+        cell.number_format = number_format
+    return cell
+
+def header_row(ws, headers):
+    """Styled header cells for a table row."""
+    return [named_cell(ws, header, 'report_header') for header in headers]
+
+def write_statement(ws, title, txns):
+    """Fill a CAPEX/OPEX statement sheet: title, then one bordered row per transaction."""
+    if len(txns):
+        for col, width in zip('ABCDEFG', STATEMENT_COLUMN_WIDTHS):
+            ws.column_dimensions[col].width = width
+    
+    ws.append([styled_cell(ws, title, font=TITLE_FONT)])
+    ws.merged_cells.add('A1:G1')
+    
+    if len(txns):
+        ws.append([])
+        ws.append(header_row(ws, ['Date', 'Source', 'Category', 'Amount', 'Description', 'Method', 'Reasoning']))
+        
+        rows = txns[['date', 'source', 'category', 'amount', 'description', 'method', 'reasoning']].assign(
+            description=txns['description'].str.slice(0, 100)
+        )
+        for row_data in rows.itertuples(index=False, name=None):
+            ws.append([
+                named_cell(ws, value, 'statement_amount' if col_idx == 4 else 'statement_text')
+                for col_idx, value in enumerate(row_data, start=1)
+            ])
+
+def category_rows(ws, by_category, total):
+    """
+    Bordered (category, amount, %) rows, largest amount first. The shares are
+    divided out in one array op before any cell is built.
+    """
+    categories = sorted(by_category, key=by_category.get, reverse=True)
+    amounts = np.fromiter((by_category[cat] for cat in categories), dtype=np.float64, count=len(categories))
+    shares = amounts / total if total > 0 else np.zeros_like(amounts)
+    for cat, amt, share in zip(categories, amounts.tolist(), shares.tolist()):
+        yield [
+            named_cell(ws, cat, 'category_text'),
+            named_cell(ws, amt, 'category_amount'),
+            named_cell(ws, share, 'category_percent')
+        ]
+
 # Node 4: Generate report
 def generate_report(state: FinancialAnalysisState) -> FinancialAnalysisState:
     print("[4/4] Generating report...")
     
-    wb = Workbook()
-    
-    header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True, size=12)
-    title_font = Font(bold=True, size=16)
-    subtitle_font = Font(bold=True, size=12)
-    currency_format = '₹#,##0.00'
-    percent_format = '0.0%'
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    # Split the transactions by type once, for the statements and the summary counts
+    txns = state['categorized_transactions']
+    is_capex = txns['expense_type'] == 'CAPEX'
+    capex_txns, opex_txns = txns[is_capex], txns[~is_capex]
+    
+    # Write-only workbook: rows are streamed to the file as they are appended, so
+    # column widths go in before each sheet's first row
+    wb = Workbook(write_only=True)
+    add_report_styles(wb)
     
     # Executive Summary
-    ws_summary = wb.active
-    ws_summary.title = "Executive Summary"
-    
-    ws_summary['A1'] = "FINANCIAL ANALYSIS REPORT"
-    ws_summary['A1'].font = title_font
-    ws_summary.merge_cells('A1:D1')
-    
-    ws_summary['A2'] = f"Period: November 2025"
-    ws_summary['A3'] = f"Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}"
-    ws_summary['A4'] = f"Method: Pure LLM (Gemini 2.5 Flash)"
-    
-    ws_summary['A6'] = "ANALYSIS NOTES"
-    ws_summary['A6'].font = subtitle_font
-    ws_summary['A7'] = f"• Total Transactions: {state['stats']['total']}"
-    ws_summary['A8'] = f"• Business Rules Applied: {state['stats'].get('business_rules', 0)}"
-    ws_summary['A9'] = f"• LLM Categorized: {state['stats']['llm_categorized']}"
-    ws_summary['A10'] = f"• Originally Uncategorized: {state['stats'].get('uncategorized_original', 0)}"
-    ws_summary['A11'] = f"• LLM Assigned Categories: {state['stats'].get('uncategorized_assigned', 0)}"
-    ws_summary['A12'] = f"• Still Uncategorized: {state['stats'].get('uncategorized_remaining', 0)}"
-    ws_summary['A13'] = f"• LQ Prepaid: Excluded (internal transfers)"
-    
-    ws_summary['A15'] = "BUSINESS RULES"
-    ws_summary['A15'].font = subtitle_font
-    ws_summary['A16'] = "1. Mechanical Hardware → CAPEX (hardware company)"
-    ws_summary['A17'] = "2. Mister Vishwanatha + Uncategorized (>1000) → CAPEX"
-    
-    ws_summary['A19'] = "CATEGORY ASSIGNMENT"
-    ws_summary['A19'].font = subtitle_font
-    ws_summary['A20'] = "The LLM analyzes transaction descriptions to assign proper categories"
-    ws_summary['A21'] = "to items originally marked as 'Uncategorized' in the source data."
-    
-    ws_summary['A23'] = "EXPENDITURE SUMMARY"
-    ws_summary['A23'].font = subtitle_font
-    ws_summary.merge_cells('A23:D23')
+    ws_summary = wb.create_sheet("Executive Summary")
+    ws_summary.column_dimensions['A'].width = 45
+    ws_summary.column_dimensions['B'].width = 20
+    ws_summary.column_dimensions['C'].width = 15
+    ws_summary.column_dimensions['D'].width = 12
+    
+    ws_summary.append([styled_cell(ws_summary, "FINANCIAL ANALYSIS REPORT", font=TITLE_FONT)])
+    ws_summary.merged_cells.add('A1:D1')
+    
+    ws_summary.append([f"Period: November 2025"])
+    ws_summary.append([f"Generated: {datetime.now().strftime('%B %d, %Y at %I:%M %p')}"])
+    ws_summary.append([f"Method: Pure LLM (Gemini 2.5 Flash)"])
+    ws_summary.append([])
+    
+    ws_summary.append([styled_cell(ws_summary, "ANALYSIS NOTES", font=SUBTITLE_FONT)])
+    ws_summary.append([f"• Total Transactions: {state['stats']['total']}"])
+    ws_summary.append([f"• Business Rules Applied: {state['stats'].get('business_rules', 0)}"])
+    ws_summary.append([f"• LLM Categorized: {state['stats']['llm_categorized']}"])
+    ws_summary.append([f"• LLM Cache Hits: {state['stats'].get('cached', 0)}"])
+    ws_summary.append([f"• Reused From Previous Run: {state['stats'].get('reused', 0)}"])
+    ws_summary.append([f"• Originally Uncategorized: {state['stats'].get('uncategorized_original', 0)}"])
+    ws_summary.append([f"• LLM Assigned Categories: {state['stats'].get('uncategorized_assigned', 0)}"])
+    ws_summary.append([f"• Still Uncategorized: {state['stats'].get('uncategorized_remaining', 0)}"])
+    ws_summary.append([f"• LQ Prepaid: Excluded (internal transfers)"])
+    ws_summary.append([])
+    
+    ws_summary.append([styled_cell(ws_summary, "BUSINESS RULES", font=SUBTITLE_FONT)])
+    ws_summary.append(["1. Mechanical Hardware → CAPEX (hardware company)"])
+    ws_summary.append(["2. Mister Vishwanatha + Uncategorized (>1000) → CAPEX"])
+    ws_summary.append([])
+    
+    ws_summary.append([styled_cell(ws_summary, "CATEGORY ASSIGNMENT", font=SUBTITLE_FONT)])
+    ws_summary.append(["The LLM analyzes transaction descriptions to assign proper categories"])
+    ws_summary.append(["to items originally marked as 'Uncategorized' in the source data."])
+    ws_summary.append([])
+    
+    ws_summary.append([styled_cell(ws_summary, "EXPENDITURE SUMMARY", font=SUBTITLE_FONT)])
+    ws_summary.merged_cells.add('A25:D25')
+    ws_summary.append([])
     
     total_exp = state['capex_total'] + state['opex_total']
     summary_data = [
         ['Type', 'Amount (INR)', '%', 'Count'],
-        ['CAPEX', state['capex_total'], state['capex_total']/total_exp if total_exp > 0 else 0,
-         len([t for t in state['categorized_transactions'] if t['expense_type'] == 'CAPEX'])],
-        ['OPEX', state['opex_total'], state['opex_total']/total_exp if total_exp > 0 else 0,
-         len([t for t in state['categorized_transactions'] if t['expense_type'] == 'OPEX'])],
+        ['CAPEX', state['capex_total'], state['capex_total']/total_exp if total_exp > 0 else 0, len(capex_txns)],
+        ['OPEX', state['opex_total'], state['opex_total']/total_exp if total_exp > 0 else 0, len(opex_txns)],
         ['TOTAL', total_exp, 1.0, len(state['categorized_transactions'])]
     ]
     
-    for row_idx, row_data in enumerate(summary_data, start=25):
+    for row_idx, row_data in enumerate(summary_data, start=27):
+        row = []
         for col_idx, value in enumerate(row_data, start=1):
-            cell = ws_summary.cell(row=row_idx, column=col_idx, value=value)
-            if row_idx == 25:
-                cell.fill = header_fill
-                cell.font = header_font
-            elif row_idx == 28:
-                cell.font = Font(bold=True)
-            if col_idx == 2 and row_idx > 25:
-                cell.number_format = currency_format
-            if col_idx == 3 and row_idx > 25:
-                cell.number_format = percent_format
-            cell.border = border
-            cell.alignment = Alignment(horizontal='left' if col_idx == 1 else 'right')
-    
-    ws_summary.column_dimensions['A'].width = 45
-    ws_summary.column_dimensions['B'].width = 20
-    ws_summary.column_dimensions['C'].width = 15
-    ws_summary.column_dimensions['D'].width = 12
+            cell = styled_cell(
+                ws_summary, value, border=BORDER,
+                alignment=LEFT_ALIGN if col_idx == 1 else RIGHT_ALIGN
+            )
+            if row_idx == 27:
+                cell.fill = HEADER_FILL
+                cell.font = HEADER_FONT
+            elif row_idx == 30:
+                cell.font = TOTAL_FONT
+            if col_idx == 2 and row_idx > 27:
+                cell.number_format = CURRENCY_FORMAT
+            if col_idx == 3 and row_idx > 27:
+                cell.number_format = PERCENT_FORMAT
+            row.append(cell)
+        ws_summary.append(row)
     
     # CAPEX Statement
-    ws_capex = wb.create_sheet("CAPEX Statement")
-    ws_capex['A1'] = "CAPITAL EXPENDITURES"
-    ws_capex['A1'].font = title_font
-    ws_capex.merge_cells('A1:G1')
-    
-    capex_txns = [t for t in state['categorized_transactions'] if t['expense_type'] == 'CAPEX']
-    
-    if capex_txns:
-        headers = ['Date', 'Source', 'Category', 'Amount', 'Description', 'Method', 'Reasoning']
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws_capex.cell(row=3, column=col_idx, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-        
-        for row_idx, txn in enumerate(capex_txns, start=4):
-            row_data = [
-                txn['date'], txn['source'], txn['category'], txn['amount'],
-                txn['description'][:100], txn.get('method', ''), txn['reasoning']
-            ]
-            for col_idx, value in enumerate(row_data, start=1):
-                cell = ws_capex.cell(row=row_idx, column=col_idx, value=value)
-                if col_idx == 4:
-                    cell.number_format = currency_format
-                cell.border = border
-                cell.alignment = Alignment(horizontal='left', wrap_text=True)
-        
-        ws_capex.column_dimensions['A'].width = 12
-        ws_capex.column_dimensions['B'].width = 15
-        ws_capex.column_dimensions['C'].width = 20
-        ws_capex.column_dimensions['D'].width = 18
-        ws_capex.column_dimensions['E'].width = 35
-        ws_capex.column_dimensions['F'].width = 15
-        ws_capex.column_dimensions['G'].width = 40
+    write_statement(wb.create_sheet("CAPEX Statement"), "CAPITAL EXPENDITURES", capex_txns)
     
     # OPEX Statement
-    ws_opex = wb.create_sheet("OPEX Statement")
-    ws_opex['A1'] = "OPERATING EXPENDITURES"
-    ws_opex['A1'].font = title_font
-    ws_opex.merge_cells('A1:G1')
-    
-    opex_txns = [t for t in state['categorized_transactions'] if t['expense_type'] == 'OPEX']
-    
-    if opex_txns:
-        headers = ['Date', 'Source', 'Category', 'Amount', 'Description', 'Method', 'Reasoning']
-        for col_idx, header in enumerate(headers, start=1):
-            cell = ws_opex.cell(row=3, column=col_idx, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.border = border
-        
-        for row_idx, txn in enumerate(opex_txns, start=4):
-            row_data = [
-                txn['date'], txn['source'], txn['category'], txn['amount'],
-                txn['description'][:100], txn.get('method', ''), txn['reasoning']
-            ]
-            for col_idx, value in enumerate(row_data, start=1):
-                cell = ws_opex.cell(row=row_idx, column=col_idx, value=value)
-                if col_idx == 4:
-                    cell.number_format = currency_format
-                cell.border = border
-                cell.alignment = Alignment(horizontal='left', wrap_text=True)
-        
-        ws_opex.column_dimensions['A'].width = 12
-        ws_opex.column_dimensions['B'].width = 15
-        ws_opex.column_dimensions['C'].width = 20
-        ws_opex.column_dimensions['D'].width = 18
-        ws_opex.column_dimensions['E'].width = 35
-        ws_opex.column_dimensions['F'].width = 15
-        ws_opex.column_dimensions['G'].width = 40
+    write_statement(wb.create_sheet("OPEX Statement"), "OPERATING EXPENDITURES", opex_txns)
     
     # Category Analysis
     ws_analysis = wb.create_sheet("Category Analysis")
-    ws_analysis['A1'] = "CATEGORY BREAKDOWN"
-    ws_analysis['A1'].font = title_font
-    ws_analysis.merge_cells('A1:C1')
+    ws_analysis.column_dimensions['A'].width = 30
+    ws_analysis.column_dimensions['B'].width = 20
+    ws_analysis.column_dimensions['C'].width = 15
     
-    ws_analysis['A3'] = "CAPEX BY CATEGORY"
-    ws_analysis['A3'].font = subtitle_font
-    ws_analysis.merge_cells('A3:C3')
+    ws_analysis.append([styled_cell(ws_analysis, "CATEGORY BREAKDOWN", font=TITLE_FONT)])
+    ws_analysis.merged_cells.add('A1:C1')
+    ws_analysis.append([])
+    
+    ws_analysis.append([styled_cell(ws_analysis, "CAPEX BY CATEGORY", font=SUBTITLE_FONT)])
+    ws_analysis.merged_cells.add('A3:C3')
     
     headers = ['Category', 'Amount', '%']
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws_analysis.cell(row=4, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    ws_analysis.append(header_row(ws_analysis, headers))
     
-    capex_sorted = sorted(state['capex_by_category'].items(), key=lambda x: x[1], reverse=True)
-    for idx, (cat, amt) in enumerate(capex_sorted, start=5):
-        ws_analysis[f'A{idx}'] = cat
-        ws_analysis[f'B{idx}'] = amt
-        ws_analysis[f'B{idx}'].number_format = currency_format
-        ws_analysis[f'C{idx}'] = amt / state['capex_total'] if state['capex_total'] > 0 else 0
-        ws_analysis[f'C{idx}'].number_format = percent_format
-        for col in ['A', 'B', 'C']:
-            ws_analysis[f'{col}{idx}'].border = border
-    
-    opex_start = len(capex_sorted) + 7
-    ws_analysis[f'A{opex_start}'] = "OPEX BY CATEGORY"
-    ws_analysis[f'A{opex_start}'].font = subtitle_font
-    ws_analysis.merge_cells(f'A{opex_start}:C{opex_start}')
-    
-    opex_header_row = opex_start + 1
-    for col_idx, header in enumerate(headers, start=1):
-        cell = ws_analysis.cell(row=opex_header_row, column=col_idx, value=header)
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = border
+    capex_count = 0
+    for row in category_rows(ws_analysis, state['capex_by_category'], state['capex_total']):
+        ws_analysis.append(row)
+        capex_count += 1
     
-    opex_sorted = sorted(state['opex_by_category'].items(), key=lambda x: x[1], reverse=True)
-    for idx, (cat, amt) in enumerate(opex_sorted, start=opex_header_row+1):
-        ws_analysis[f'A{idx}'] = cat
-        ws_analysis[f'B{idx}'] = amt
-        ws_analysis[f'B{idx}'].number_format = currency_format
-        ws_analysis[f'C{idx}'] = amt / state['opex_total'] if state['opex_total'] > 0 else 0
-        ws_analysis[f'C{idx}'].number_format = percent_format
-        for col in ['A', 'B', 'C']:
-            ws_analysis[f'{col}{idx}'].border = border
+    opex_start = capex_count + 7
+    ws_analysis.append([])
+    ws_analysis.append([])
+    ws_analysis.append([styled_cell(ws_analysis, "OPEX BY CATEGORY", font=SUBTITLE_FONT)])
+    ws_analysis.merged_cells.add(f'A{opex_start}:C{opex_start}')
     
-    ws_analysis.column_dimensions['A'].width = 30
-    ws_analysis.column_dimensions['B'].width = 20
-    ws_analysis.column_dimensions['C'].width = 15
+    ws_analysis.append(header_row(ws_analysis, headers))
+    for row in category_rows(ws_analysis, state['opex_by_category'], state['opex_total']):
+        ws_analysis.append(row)
     
     filename = f"Financial_Statement_Hardware_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
     wb.save(filename)
@@ -558,6 +801,8 @@ def print_summary(state: FinancialAnalysisState) -> FinancialAnalysisState:
     print("="*80)
     print(f"\n📊 Total: {state['stats']['total']} transactions")
     print(f"   Business Rules: {state['stats'].get('business_rules', 0)}")
+    print(f"   Reused From Last Run: {state['stats'].get('reused', 0)}")
+    print(f"   Cache Hits: {state['stats'].get('cached', 0)}")
     print(f"   LLM Categorized: {state['stats']['llm_categorized']}")
     print(f"\n📝 Category Assignment:")
     print(f"   Originally Uncategorized: {state['stats'].get('uncategorized_original', 0)}")
@@ -596,8 +841,8 @@ def main():
     print("="*80 + "\n")
     
     initial_state = {
-        'raw_transactions': [],
-        'categorized_transactions': [],
+        'raw_transactions': pd.DataFrame(columns=TRANSACTION_COLUMNS),
+        'categorized_transactions': pd.DataFrame(columns=TRANSACTION_COLUMNS),
         'capex_total': 0.0,
         'opex_total': 0.0,
         'capex_by_category': {},
@@ -0,0 +1,16 @@
+import diskcache
+import orjson
+
+class OrjsonDisk(diskcache.Disk):
+    """diskcache storage that keeps values as orjson bytes instead of pickles."""
+    
+    def store(self, value, read, key=diskcache.core.UNKNOWN):
+        if not read:
+            value = orjson.dumps(value)
+        return super().store(value, read, key=key)
+    
+    def fetch(self, mode, filename, value, read):
+        data = super().fetch(mode, filename, value, read)
+        if not read:
+            data = orjson.loads(data)
+        return data
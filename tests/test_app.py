@@ -0,0 +1,275 @@
+import re
+import tempfile
+import unittest
+from datetime import datetime
+from io import BytesIO
+from unittest import mock
+
+import diskcache
+import openpyxl
+import orjson
+import pandas as pd
+import streamlit as st
+from langchain_core.exceptions import ModelConnectionError, ModelTimeoutError
+
+# app.py reads the API key from Streamlit secrets at import time
+st.secrets = {"GOOGLE_API_KEY": "test-key"}
+
+import app
+
+
+class FlakyLLM:
+    """Fake chat model that raises `error` on its first call, then answers."""
+
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        if self.calls == 1:
+            raise self.error
+        return mock.Mock(content='[{"id": 1, "type": "OPEX", "category": "Food", "reasoning": "lunch"}]')
+
+
+class LLMRetryTest(unittest.TestCase):
+
+    def run_flaky_batch(self, error):
+        llm = FlakyLLM(error)
+        with mock.patch.object(app, 'LLM_BACKOFF', lambda retry_state: 0):
+            results = app.run_llm_batches(llm, "system", ["1. lunch"], lambda done: None)
+        return llm, results
+
+    def test_timeout_is_retried(self):
+        llm, results = self.run_flaky_batch(ModelTimeoutError("timed out"))
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(results, [[{"id": 1, "type": "OPEX", "category": "Food", "reasoning": "lunch"}]])
+
+    def test_connection_error_is_retried(self):
+        llm, results = self.run_flaky_batch(ModelConnectionError("connection reset"))
+        self.assertEqual(llm.calls, 2)
+        self.assertEqual(results, [[{"id": 1, "type": "OPEX", "category": "Food", "reasoning": "lunch"}]])
+
+
+class LLMMemoTest(unittest.TestCase):
+
+    def setUp(self):
+        app.get_llm_memo().clear()
+
+    def test_least_recently_used_entry_is_dropped(self):
+        with mock.patch.object(app, 'LLM_MEMO_SIZE', 2):
+            app.memo_set('a', {'type': 'OPEX'})
+            app.memo_set('b', {'type': 'CAPEX'})
+            app.memo_get('a')
+            app.memo_set('c', {'type': 'OPEX'})
+        self.assertEqual(list(app.get_llm_memo()), ['a', 'c'])
+        self.assertIsNone(app.memo_get('b'))
+
+
+
+def categorized(method='junior-analyst'):
+    """A small analysis result: one CAPEX and one OPEX transaction."""
+    return [
+        {'source': 'Kodo-Pay', 'date': '2025-01-02', 'amount': 1500.0, 'category': 'Hardware',
+         'description': 'motor', 'expense_type': 'CAPEX', 'method': 'junior-analyst', 'reasoning': 'asset'},
+        {'source': 'Transactions', 'date': '2025-01-03', 'amount': 200.0, 'category': 'Food',
+         'description': 'lunch', 'expense_type': 'OPEX', 'method': method, 'reasoning': 'meal'},
+    ]
+
+
+class ReportCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = diskcache.Cache(tmp.name)
+        self.addCleanup(cache.close)
+        patcher = mock.patch.object(app, 'REPORT_CACHE', cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_serves_saved_report(self):
+        generated = datetime(2025, 1, 31, 9, 30)
+        app.save_report('key', categorized(), ['bad row'], b'xlsx', generated)
+        report = app.load_report('key')
+        self.assertEqual(report['data'], categorized())
+        self.assertEqual(report['errors'], ['bad row'])
+        self.assertEqual(report['xlsx'], b'xlsx')
+        self.assertEqual(report['generated'], generated)
+
+    def test_miss_for_other_uploads(self):
+        app.save_report('key', categorized(), [], b'xlsx', datetime.now())
+        self.assertIsNone(app.load_report('other'))
+
+    def test_report_with_fallbacks_is_not_stored(self):
+        app.save_report('key', categorized(method='fallback'), [], b'xlsx', datetime.now())
+        self.assertIsNone(app.load_report('key'))
+
+
+class CreateExcelTest(unittest.TestCase):
+
+    def test_four_sheets_stamped_with_generated_time(self):
+        cdf = pd.DataFrame.from_records(categorized())
+        totals = {'count': 2, 'total': 1700.0, 'capex': 1500.0, 'opex': 200.0}
+        excel = app.create_excel(
+            cdf.loc[cdf['expense_type'] == 'CAPEX'], cdf.loc[cdf['expense_type'] == 'OPEX'],
+            totals, app.category_totals(cdf), datetime(2025, 1, 31, 9, 30)
+        )
+        wb = openpyxl.load_workbook(excel)
+        self.assertEqual(wb.sheetnames, ['Executive Summary', 'CAPEX Statement', 'OPEX Statement', 'Category Breakdown'])
+        self.assertEqual(wb['Executive Summary']['A2'].value, 'Generated: January 31, 2025 at 09:30 AM')
+
+
+
+class PromptLinesTest(unittest.TestCase):
+
+    def test_prompt_line_format(self):
+        df = pd.DataFrame({'amount': [1500.0], 'category': ['Food'], 'description': ['lunch | Food']})
+        self.assertEqual(app.prompt_lines(df).tolist(), ['₹1,500.00 | Cat: Food | Desc: lunch | Food'])
+
+    def test_rows_settled_by_rules_get_no_prompt_line(self):
+        tdf, errors = app.load_transactions(
+            b"Date (IST),Dr/Cr,Txn Amount (INR),Category,Narration on Kodo Pay\n"
+            b"2025-01-02,Dr,1500,Mechanical Hardware,bolts\n",
+            None
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(tdf['method'].tolist(), ['business-rule'])
+        self.assertEqual(tdf['prompt_line'].tolist(), [''])
+
+
+class LoadTransactionsTest(unittest.TestCase):
+
+    def load_kodo(self, csv):
+        tdf, errors = app.load_transactions(csv.encode(), None)
+        self.assertEqual(errors, [])
+        return tdf.iloc[0]
+
+    def test_present_category_is_kept(self):
+        txn = self.load_kodo(
+            "Date (IST),Dr/Cr,Txn Amount (INR),Category,Narration on Kodo Pay,Maker Name\n"
+            "2025-01-02,Dr,1500,Food,lunch,Vishwanatha\n"
+        )
+        self.assertEqual((txn['category'], txn['method']), ('Food', 'pending'))
+
+    def test_blank_category_stays_blank(self):
+        txn = self.load_kodo(
+            "Date (IST),Dr/Cr,Txn Amount (INR),Category,Narration on Kodo Pay,Maker Name\n"
+            "2025-01-02,Dr,1500,,lunch,Vishwanatha\n"
+        )
+        self.assertEqual((txn['category'], txn['method']), ('', 'pending'))
+
+    def test_missing_category_column_is_uncategorized(self):
+        txn = self.load_kodo(
+            "Date (IST),Dr/Cr,Txn Amount (INR),Narration on Kodo Pay,Maker Name\n"
+            "2025-01-02,Dr,1500,drill,Vishwanatha\n"
+        )
+        self.assertEqual(txn['original_category'], 'Uncategorized')
+        self.assertEqual((txn['category'], txn['method']), ('Capital Investment', 'business-rule'))
+
+
+
+class SemanticCacheKeyTest(unittest.TestCase):
+
+    def key(self, description, amount=1500.0, category='Hardware'):
+        return app.semantic_cache_key({'category': category, 'description': description, 'amount': amount})
+
+    def test_shared_by_near_duplicates(self):
+        self.assertEqual(self.key('Amazon order #4411 | Hardware'), self.key('AMAZON ORDER 9920, Hardware'))
+        self.assertEqual(self.key('Amazon order 4411', 1520.0), self.key('Amazon order 9920', 1480.0))
+
+    def test_not_shared_across_amount_buckets(self):
+        self.assertNotEqual(self.key('Amazon order 4411', 1500.0), self.key('Amazon order 4411', 15000.0))
+        self.assertNotEqual(self.key('Amazon order 4411', 1540.0), self.key('Amazon order 4411', 1660.0))
+
+    def test_not_shared_across_categories_or_wording(self):
+        self.assertNotEqual(self.key('Amazon order 4411'), self.key('Amazon order 4411', category='Food'))
+        self.assertNotEqual(self.key('Amazon order 4411'), self.key('Flipkart order 4411'))
+
+
+
+class MatchResultsTest(unittest.TestCase):
+
+    batch = [{'description': 'lunch'}, {'description': 'drill'}, {'description': 'taxi'}]
+
+    def matched(self, results):
+        return [(txn['description'], result['category']) for txn, result in app.match_results(self.batch, results)]
+
+    def test_reordered_results_match_by_id(self):
+        self.assertEqual(
+            self.matched([{'id': 3, 'category': 'Travel'}, {'id': 1, 'category': 'Food'}, {'id': 2, 'category': 'Tools'}]),
+            [('lunch', 'Food'), ('drill', 'Tools'), ('taxi', 'Travel')]
+        )
+
+    def test_results_without_an_id_are_dropped(self):
+        self.assertEqual(
+            self.matched([{'category': 'Food'}, {'id': 'two', 'category': 'Tools'}, {'id': 3, 'category': 'Travel'}]),
+            [('taxi', 'Travel')]
+        )
+
+    def test_duplicate_id_keeps_the_first_result(self):
+        self.assertEqual(
+            self.matched([{'id': 2, 'category': 'Tools'}, {'id': 2, 'category': 'Food'}]),
+            [('drill', 'Tools')]
+        )
+
+    def test_extra_ids_are_ignored(self):
+        self.assertEqual(
+            self.matched([{'id': 1, 'category': 'Food'}, {'id': 4, 'category': 'Rent'}, {'id': 0, 'category': 'Rent'}]),
+            [('lunch', 'Food')]
+        )
+
+    def test_short_reply_leaves_the_rest_unmatched(self):
+        self.assertEqual(self.matched([{'id': '2', 'category': 'Tools'}]), [('drill', 'Tools')])
+
+
+
+class EchoLLM:
+    """Fake chat model that answers every numbered prompt line with that line as reasoning, recording the prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def ainvoke(self, messages):
+        self.prompts.append(messages[-1].content)
+        lines = re.findall(r'^(\d+)\. (.*)$', messages[-1].content, re.MULTILINE)
+        return mock.Mock(content=orjson.dumps([
+            {'id': int(i), 'type': 'CAPEX', 'category': 'Tools', 'reasoning': line} for i, line in lines
+        ]).decode())
+
+
+class DuplicatePromptTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache = diskcache.Cache(tmp.name)
+        self.addCleanup(cache.close)
+        app.get_llm_memo().clear()
+        self.llm = EchoLLM()
+        for patcher in (
+            mock.patch.object(app, 'LLM_CACHE', cache),
+            mock.patch.object(app, 'get_llm', lambda: self.llm),
+            mock.patch.object(app, 'generate_categories', lambda transactions, status_text: ['Tools']),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_duplicates_are_sent_once_and_share_the_answer(self):
+        kodo = BytesIO(
+            b"Date (IST),Dr/Cr,Txn Amount (INR),Category,Narration on Kodo Pay\n"
+            b"2025-01-02,Dr,300,Tools,drill bits\n"
+            b"2025-01-03,Dr,300,Tools,drill bits\n"
+            b"2025-01-04,Dr,80,Food,lunch\n"
+            b"2025-01-05,Dr,300,Tools,drill bits\n"
+        )
+        categorized, errors = app.process_files(kodo, None, mock.Mock(), mock.Mock())
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.llm.prompts), 1)
+        self.assertEqual(len(re.findall(r'^\d+\. ', self.llm.prompts[0], re.MULTILINE)), 2)
+        self.assertEqual([txn['method'] for txn in categorized], ['junior-analyst'] * 4)
+        self.assertEqual([txn['reasoning'] for txn in categorized], [txn['prompt_line'] for txn in categorized])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import diskcache
+import pandas as pd
+
+import langgraph_financial_analysis as lg
+from orjson_disk import OrjsonDisk
+
+
+class FakeLLM:
+    """Fake structured-output model that replies with a fixed list of CategorizationResults."""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return lg.CategorizationBatch(items=self.items)
+
+
+def transaction(description, category='Food'):
+    return {'source': 'Kodo-Pay', 'date': '2025-01-02', 'amount': 250.0, 'category': category, 'description': description}
+
+
+class CategorizeBatchTest(unittest.TestCase):
+
+    def categorize(self, items, batch):
+        return asyncio.run(lg.categorize_batch(FakeLLM(items), [], batch))
+
+    def test_reordered_answers_are_matched_by_id(self):
+        batch = [transaction('lunch'), transaction('drill', 'Uncategorized')]
+        categorized = self.categorize([
+            lg.CategorizationResult(id=2, type='CAPEX', category='Tools', reasoning='drill'),
+            lg.CategorizationResult(id=1, type='OPEX', category='Food', reasoning='meal'),
+        ], batch)
+        self.assertEqual([txn['description'] for txn in categorized], ['lunch', 'drill'])
+        self.assertEqual([txn['expense_type'] for txn in categorized], ['OPEX', 'CAPEX'])
+        self.assertEqual([txn['category'] for txn in categorized], ['Food', 'Tools'])
+        self.assertEqual([txn['method'] for txn in categorized], ['pure-llm', 'pure-llm'])
+
+    def test_unanswered_transactions_get_the_fallback(self):
+        batch = [transaction('lunch'), transaction('taxi'), transaction('drill', 'Uncategorized')]
+        categorized = self.categorize([
+            lg.CategorizationResult(id=3, type='CAPEX', category='Tools', reasoning='drill'),
+            lg.CategorizationResult(id=7, type='CAPEX', category='Tools', reasoning='not in the batch'),
+        ], batch)
+        self.assertEqual([txn['method'] for txn in categorized], ['error-fallback', 'error-fallback', 'pure-llm'])
+        self.assertEqual([txn['expense_type'] for txn in categorized], ['OPEX', 'OPEX', 'CAPEX'])
+        self.assertEqual([txn['confidence'] for txn in categorized], ['low', 'low', 'llm'])
+        self.assertEqual(categorized[0]['category'], 'Food')
+
+
+def raw_transactions(descriptions):
+    """A raw transaction frame as load_data builds it, one Kodo-Pay row per description."""
+    return pd.DataFrame.from_records(
+        [{**transaction(description), 'narration': description, 'maker_name': 'Asha'} for description in descriptions],
+        columns=lg.TRANSACTION_COLUMNS
+    )
+
+
+class PreviousResultsTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.results_path = os.path.join(tmp.name, 'results.parquet')
+        cache = diskcache.Cache(os.path.join(tmp.name, 'cache'), disk=OrjsonDisk)
+        self.addCleanup(cache.close)
+        for patcher in (mock.patch.object(lg, 'RESULTS_PATH', self.results_path), mock.patch.object(lg, 'LLM_CACHE', cache)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def categorize(self, rt, llm):
+        state = {'raw_transactions': rt, 'errors': [], 'stats': {}}
+        with mock.patch.object(lg, 'get_llm', lambda: llm), contextlib.redirect_stdout(io.StringIO()):
+            return lg.categorize_with_llm(state)
+
+    def test_saved_results_round_trip_without_fallbacks(self):
+        rt = raw_transactions(['lunch', 'taxi'])
+        categorized = rt.assign(
+            row_hash=lg.row_hashes(rt), original_category='Food', expense_type='OPEX', confidence=['llm', 'low'],
+            reasoning=['LLM: meal', 'Error: boom'], method=['pure-llm', 'error-fallback']
+        )
+        state = {'errors': []}
+        lg.save_results(state, categorized)
+        previous = lg.load_previous_results(state)
+        self.assertEqual(state['errors'], [])
+        self.assertEqual(list(previous.index), [lg.row_hashes(rt)[0]])
+        self.assertEqual(previous.iloc[0][lg.CATEGORIZATION_COLUMNS].tolist(), ['Food', 'Food', 'OPEX', 'llm', 'LLM: meal', 'pure-llm'])
+
+    def test_unchanged_rows_are_reused(self):
+        self.categorize(raw_transactions(['lunch', 'taxi']), FakeLLM([
+            lg.CategorizationResult(id=1, type='OPEX', category='Food', reasoning='meal'),
+            lg.CategorizationResult(id=2, type='OPEX', category='Travel', reasoning='ride'),
+        ]))
+        llm = FakeLLM([lg.CategorizationResult(id=1, type='CAPEX', category='Tools', reasoning='drill')])
+        state = self.categorize(raw_transactions(['lunch', 'drill']), llm)
+        categorized = state['categorized_transactions'].set_index('description')
+        self.assertEqual(llm.calls, 1)
+        self.assertEqual(state['stats']['reused'], 1)
+        self.assertEqual(categorized.loc['lunch', 'category'], 'Food')
+        self.assertEqual(categorized.loc['drill', 'category'], 'Tools')
+
+    def test_file_with_other_columns_is_ignored(self):
+        pd.DataFrame({'row_hash': [1], 'label': ['x']}).to_parquet(self.results_path)
+        state = {'errors': []}
+        self.assertTrue(lg.load_previous_results(state).empty)
+        self.assertEqual(len(state['errors']), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import io
+import os
+import tempfile
+import unittest
+
+import diskcache
+
+from orjson_disk import OrjsonDisk
+
+
+class OrjsonDiskTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache = diskcache.Cache(tmp.name, disk=OrjsonDisk, disk_min_file_size=1024)
+        self.addCleanup(self.cache.close)
+
+    def data_files(self):
+        return [name for _, _, names in os.walk(self.cache.directory) for name in names if name.endswith('.val')]
+
+    def test_small_value_round_trips_inline(self):
+        value = {'type': 'OPEX', 'category': 'Food', 'reasoning': 'lunch'}
+        self.cache.set('small', value)
+        self.assertEqual(self.cache.get('small'), value)
+        self.assertEqual(self.data_files(), [])
+
+    def test_large_value_round_trips_through_a_file(self):
+        value = {'type': 'CAPEX', 'category': 'Hardware', 'reasoning': 'x' * 4096}
+        self.cache.set('large', value)
+        self.assertEqual(self.cache.get('large'), value)
+        self.assertEqual(len(self.data_files()), 1)
+
+    def test_read_mode_stores_and_returns_raw_bytes(self):
+        raw = b'not json \x00\xff' * 200
+        self.cache.set('raw', io.BytesIO(raw), read=True)
+        with self.cache.get('raw', read=True) as handle:
+            self.assertEqual(handle.read(), raw)
+
+
+if __name__ == '__main__':
+    unittest.main()